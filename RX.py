@@ -9,29 +9,58 @@
 # GNU Radio version: 3.10.10.0
 
 from gnuradio import blocks
+from gnuradio import filter
 from gnuradio import gr
 from gnuradio.filter import firdes
+from gnuradio.filter import pfb
 from gnuradio.fft import window
 import sys
 import signal
+import time
 from argparse import ArgumentParser
 from gnuradio.eng_arg import eng_float, intx
 from gnuradio import eng_notation
 from gnuradio import soapy
+from buffered_sink import buffered_file_sink
+from channels import (CHANNEL_ATTENUATION, CHANNEL_CUTOFF, CHANNEL_TRANSITION, DECIMATION_CUTOFF,
+                      DECIMATION_TRANSITION, channel_offset)
+from probe import probe_or_exit
+from profiling import write_block_report
+from sigmf_meta import write_meta
+from start_barrier import wait_for_start
+from tag_recorder import tag_recorder
+from trigger_sink import trigger_file_sink
 
 
 
 
 class RX(gr.top_block):
 
-    def __init__(self):
+    def __init__(self, buffered_sink=0, channels='', decimation=1, lna_gain=40, num_chans=8, num_samples=50000000,
+                 trigger=0, trigger_post=0.001, trigger_pre=0.001, trigger_threshold=-30.0, vga_gain=0):
         gr.top_block.__init__(self, "RX", catch_exceptions=True)
 
+        ##################################################
+        # Parameters
+        ##################################################
+        self.buffered_sink = buffered_sink
+        self.channels = channels
+        self.decimation = decimation
+        self.lna_gain = lna_gain
+        self.num_chans = num_chans
+        self.num_samples = num_samples
+        self.trigger = trigger
+        self.trigger_post = trigger_post
+        self.trigger_pre = trigger_pre
+        self.trigger_threshold = trigger_threshold
+        self.vga_gain = vga_gain
+
         ##################################################
         # Variables
         ##################################################
         self.samp_rate = samp_rate = 10000000
         self.center_freq = center_freq = 2400000000
+        self.channel_list = channel_list = [int(c) for c in channels.split(',') if c.strip()]
 
         ##################################################
         # Blocks
@@ -49,19 +78,103 @@ class RX(gr.top_block):
         self.soapy_hackrf_source_0.set_bandwidth(0, 0)
         self.soapy_hackrf_source_0.set_frequency(0, center_freq)
         self.soapy_hackrf_source_0.set_gain(0, 'AMP', False)
-        self.soapy_hackrf_source_0.set_gain(0, 'LNA', min(max(40, 0.0), 40.0))
-        self.soapy_hackrf_source_0.set_gain(0, 'VGA', min(max(0, 0.0), 62.0))
-        self.blocks_head_0 = blocks.head(gr.sizeof_gr_complex*1, 50000000)
-        self.blocks_file_sink_0 = blocks.file_sink(gr.sizeof_gr_complex*1, 'Data/rxdata.dat', False)
-        self.blocks_file_sink_0.set_unbuffered(True)
+        self.soapy_hackrf_source_0.set_gain(0, 'LNA', min(max(lna_gain, 0.0), 40.0))
+        self.soapy_hackrf_source_0.set_gain(0, 'VGA', min(max(vga_gain, 0.0), 62.0))
+        self.blocks_head_0 = blocks.head(gr.sizeof_gr_complex*1, num_samples // decimation)
+        if decimation > 1:
+            self.low_pass_filter_0 = filter.fir_filter_ccf(
+                decimation,
+                firdes.low_pass(1, samp_rate, DECIMATION_CUTOFF * samp_rate / decimation,
+                                DECIMATION_TRANSITION * samp_rate / decimation))
+        if channel_list:
+            # Channel k is centred on k * samp_rate / num_chans (wrapping to negative
+            # offsets above num_chans / 2) and runs at samp_rate / num_chans.
+            self.pfb_channelizer_ccf_0 = pfb.channelizer_ccf(
+                num_chans,
+                firdes.low_pass_2(1, samp_rate, CHANNEL_CUTOFF * samp_rate / num_chans,
+                                  CHANNEL_TRANSITION * samp_rate / num_chans, CHANNEL_ATTENUATION),
+                1.0,
+                100)
+            for chan in range(num_chans):
+                if chan in channel_list:
+                    sink = self._make_file_sink(self.channel_path(chan), num_samples // decimation // num_chans,
+                                                samp_rate / decimation / num_chans)
+                else:
+                    sink = blocks.null_sink(gr.sizeof_gr_complex*1)
+                setattr(self, f'blocks_sink_ch{chan}', sink)
+        else:
+            self.blocks_file_sink_0 = self._make_file_sink('Data/rxdata.dat', num_samples // decimation,
+                                                           samp_rate / decimation)
+        self.tag_recorder_0 = tag_recorder()
 
 
         ##################################################
         # Connections
         ##################################################
-        self.connect((self.blocks_head_0, 0), (self.blocks_file_sink_0, 0))
-        self.connect((self.soapy_hackrf_source_0, 0), (self.blocks_head_0, 0))
+        if channel_list:
+            self.connect((self.blocks_head_0, 0), (self.pfb_channelizer_ccf_0, 0))
+            for chan in range(num_chans):
+                self.connect((self.pfb_channelizer_ccf_0, chan), (getattr(self, f'blocks_sink_ch{chan}'), 0))
+        else:
+            self.connect((self.blocks_head_0, 0), (self.blocks_file_sink_0, 0))
+        self.connect((self.blocks_head_0, 0), (self.tag_recorder_0, 0))
+        if decimation > 1:
+            self.connect((self.soapy_hackrf_source_0, 0), (self.low_pass_filter_0, 0))
+            self.connect((self.low_pass_filter_0, 0), (self.blocks_head_0, 0))
+        else:
+            self.connect((self.soapy_hackrf_source_0, 0), (self.blocks_head_0, 0))
+
+
+    def _make_file_sink(self, path, num_items, rate):
+        if self.trigger:
+            # Gated while streaming, so inactive blocks never reach the disk.
+            return trigger_file_sink(path, self.trigger_threshold, pre_samples=int(self.trigger_pre * rate),
+                                     post_samples=int(self.trigger_post * rate))
+        if self.buffered_sink:
+            return buffered_file_sink(path, preallocate_bytes=gr.sizeof_gr_complex*num_items)
+        sink = blocks.file_sink(gr.sizeof_gr_complex*1, path, False)
+        sink.set_unbuffered(False)
+        return sink
+
+    @staticmethod
+    def channel_path(chan):
+        return f'Data/rxdata_ch{chan}.dat'
+
+    def get_channels(self):
+        return self.channels
+
+    def set_channels(self, channels):
+        self.channels = channels
+
+    def get_num_chans(self):
+        return self.num_chans
+
+    def set_num_chans(self, num_chans):
+        self.num_chans = num_chans
+
+    def get_decimation(self):
+        return self.decimation
+
+    def set_decimation(self, decimation):
+        self.decimation = decimation
+
+    def get_num_samples(self):
+        return self.num_samples
 
+    def set_num_samples(self, num_samples):
+        self.num_samples = num_samples
+
+    def get_trigger(self):
+        return self.trigger
+
+    def set_trigger(self, trigger):
+        self.trigger = trigger
+
+    def get_buffered_sink(self):
+        return self.buffered_sink
+
+    def set_buffered_sink(self, buffered_sink):
+        self.buffered_sink = buffered_sink
 
     def get_samp_rate(self):
         return self.samp_rate
@@ -77,15 +190,106 @@ class RX(gr.top_block):
         self.center_freq = center_freq
         self.soapy_hackrf_source_0.set_frequency(0, self.center_freq)
 
+    def get_lna_gain(self):
+        return self.lna_gain
+
+    def set_lna_gain(self, lna_gain):
+        self.lna_gain = lna_gain
+        self.soapy_hackrf_source_0.set_gain(0, 'LNA', min(max(self.lna_gain, 0.0), 40.0))
+
+    def get_vga_gain(self):
+        return self.vga_gain
 
+    def set_vga_gain(self, vga_gain):
+        self.vga_gain = vga_gain
+        self.soapy_hackrf_source_0.set_gain(0, 'VGA', min(max(self.vga_gain, 0.0), 62.0))
+
+    def write_metadata(self, start_time):
+        gains = {'AMP': 0, 'LNA': self.lna_gain, 'VGA': self.vga_gain}
+        hw = 'HackRF One (Serial=2a8a8313)'
+        samp_rate = self.samp_rate / self.decimation
+        if not self.channel_list:
+            write_meta('Data/rxdata.sigmf-meta', samp_rate, self.center_freq, start_time,
+                       gains=gains, hw=hw, tags=self.tag_recorder_0.tags, description='RX capture')
+            return
+        for chan in self.channel_list:
+            tags = [dict(tag, offset=tag['offset'] // self.num_chans) for tag in self.tag_recorder_0.tags]
+            write_meta(self.channel_path(chan).replace('.dat', '.sigmf-meta'), samp_rate / self.num_chans,
+                       self.center_freq + channel_offset(chan, self.samp_rate, self.num_chans), start_time,
+                       gains=gains, hw=hw, tags=tags,
+                       description=f'RX channel {chan} of {self.num_chans}')
+
+
+
+
+def argument_parser():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--buffered-sink", dest="buffered_sink", type=intx, default=0,
+        help="Set write through the large-buffer background sink instead of the stock stdio-buffered file_sink (see bench_sink.py) [default=%(default)r]")
+    parser.add_argument(
+        "--channels", dest="channels", type=str, default='',
+        help="Set comma-separated PFB channels to record instead of the full band (empty disables) [default=%(default)r]")
+    parser.add_argument(
+        "--decimation", dest="decimation", type=intx, default=1,
+        help="Set low-pass and decimate before recording [default=%(default)r]")
+    parser.add_argument(
+        "--lna-gain", dest="lna_gain", type=eng_float, default=eng_notation.num_to_str(float(40)),
+        help="Set RX LNA gain in dB, 0-40 in steps of 8 [default=%(default)r]")
+    parser.add_argument(
+        "--num-chans", dest="num_chans", type=intx, default=8,
+        help="Set number of PFB channels the band is split into [default=%(default)r]")
+    parser.add_argument(
+        "--num-samples", dest="num_samples", type=intx, default=50000000,
+        help="Set input samples per capture, before decimation [default=%(default)r]")
+    parser.add_argument(
+        "--trigger", dest="trigger", type=intx, default=0,
+        help="Set write only blocks above the trigger threshold plus their context, with a .windows.json sidecar [default=%(default)r]")
+    parser.add_argument(
+        "--trigger-post", dest="trigger_post", type=eng_float, default=eng_notation.num_to_str(float(0.001)),
+        help="Set seconds kept after the last active block [default=%(default)r]")
+    parser.add_argument(
+        "--trigger-pre", dest="trigger_pre", type=eng_float, default=eng_notation.num_to_str(float(0.001)),
+        help="Set seconds kept before the first active block [default=%(default)r]")
+    parser.add_argument(
+        "--trigger-threshold", dest="trigger_threshold", type=eng_float, default=eng_notation.num_to_str(float(-30)),
+        help="Set trigger threshold as mean block power in dBFS [default=%(default)r]")
+    parser.add_argument(
+        "--vga-gain", dest="vga_gain", type=eng_float, default=eng_notation.num_to_str(float(0)),
+        help="Set RX VGA gain in dB, 0-62 in steps of 2 [default=%(default)r]")
+    parser.add_argument(
+        "--barrier", dest="barrier", type=str, default='',
+        help="Set start barrier pipe fds 'go,ready' to wait on after device open (empty starts immediately) [default=%(default)r]")
+    parser.add_argument(
+        "--probe", dest="probe", type=intx, default=0,
+        help="Set run a short device health probe before opening the device for the capture [default=%(default)r]")
+    parser.add_argument(
+        "--profile", dest="profile", type=str, default='',
+        help="Set per-block performance counter report path (empty disables) [default=%(default)r]")
+    return parser
 
 
 def main(top_block_cls=RX, options=None):
-    tb = top_block_cls()
+    if options is None:
+        options = argument_parser().parse_args()
+    if options.probe:
+        probe_or_exit('rx', options.barrier)
+    tb = top_block_cls(buffered_sink=options.buffered_sink, channels=options.channels,
+                       decimation=options.decimation, lna_gain=options.lna_gain,
+                       num_chans=options.num_chans, num_samples=options.num_samples,
+                       trigger=options.trigger, trigger_post=options.trigger_post,
+                       trigger_pre=options.trigger_pre, trigger_threshold=options.trigger_threshold,
+                       vga_gain=options.vga_gain)
+
+    wait_for_start(options.barrier)
+    start_time = time.time()
 
     def sig_handler(sig=None, frame=None):
         tb.stop()
         tb.wait()
+        tb.write_metadata(start_time)
+        if options.profile:
+            write_block_report(options.profile, tb)
 
         sys.exit(0)
 
@@ -95,6 +299,9 @@ def main(top_block_cls=RX, options=None):
     tb.start()
 
     tb.wait()
+    tb.write_metadata(start_time)
+    if options.profile:
+        write_block_report(options.profile, tb)
 
 
 if __name__ == '__main__':
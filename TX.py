@@ -15,22 +15,40 @@ from gnuradio.filter import firdes
 from gnuradio.fft import window
 import sys
 import signal
+import time
 from argparse import ArgumentParser
 from gnuradio.eng_arg import eng_float, intx
 from gnuradio import eng_notation
 from gnuradio import soapy
+from buffered_sink import buffered_file_sink
+from probe import probe_or_exit
+from profiling import write_block_report
+from sigmf_meta import write_meta
+from start_barrier import wait_for_start
+from tx_reference import write_params
+from waveforms import load_waveform
 
 
 
 
 class TX(gr.top_block):
 
-    def __init__(self):
+    def __init__(self, buffered_sink=0, record=1, vga_gain=25, waveform=''):
         gr.top_block.__init__(self, "TX", catch_exceptions=True)
 
+        ##################################################
+        # Parameters
+        ##################################################
+        self.buffered_sink = buffered_sink
+        self.record = record
+        self.vga_gain = vga_gain
+        self.waveform = waveform
+
         ##################################################
         # Variables
         ##################################################
+        self.tone_freq = tone_freq = 100000
+        self.tone_ampl = tone_ampl = 1
         self.samp_rate = samp_rate = 10000000
         self.center_freq = center_freq = 2400000000
 
@@ -50,21 +68,73 @@ class TX(gr.top_block):
         self.soapy_hackrf_sink_0.set_bandwidth(0, 0)
         self.soapy_hackrf_sink_0.set_frequency(0, center_freq)
         self.soapy_hackrf_sink_0.set_gain(0, 'AMP', False)
-        self.soapy_hackrf_sink_0.set_gain(0, 'VGA', min(max(25, 0.0), 47.0))
+        self.soapy_hackrf_sink_0.set_gain(0, 'VGA', min(max(vga_gain, 0.0), 47.0))
         self.blocks_head_0 = blocks.head(gr.sizeof_gr_complex*1, 50000000)
-        self.blocks_file_sink_0 = blocks.file_sink(gr.sizeof_gr_complex*1, 'Data/txdata.dat', False)
-        self.blocks_file_sink_0.set_unbuffered(True)
-        self.analog_sig_source_x_0 = analog.sig_source_c(samp_rate, analog.GR_SIN_WAVE, 100000, 1, 0, 0)
+        # file_sink opens and truncates its file on construction, so it only
+        # exists when TX is recorded; otherwise txparams.json stands alone.
+        if record and buffered_sink:
+            self.blocks_file_sink_0 = buffered_file_sink('Data/txdata.dat',
+                                                         preallocate_bytes=gr.sizeof_gr_complex*50000000)
+        elif record:
+            self.blocks_file_sink_0 = blocks.file_sink(gr.sizeof_gr_complex*1, 'Data/txdata.dat', False)
+            self.blocks_file_sink_0.set_unbuffered(False)
+        self.analog_sig_source_x_0 = analog.sig_source_c(samp_rate, analog.GR_SIN_WAVE, tone_freq, tone_ampl, 0, 0)
+        if waveform:
+            # Precomputed once and cached on disk; looped from memory at full rate.
+            self.blocks_vector_source_0 = blocks.vector_source_c(load_waveform(waveform, samp_rate), True, 1, [])
 
 
         ##################################################
         # Connections
         ##################################################
-        self.connect((self.analog_sig_source_x_0, 0), (self.blocks_head_0, 0))
-        self.connect((self.blocks_head_0, 0), (self.blocks_file_sink_0, 0))
+        if waveform:
+            self.connect((self.blocks_vector_source_0, 0), (self.blocks_head_0, 0))
+        else:
+            self.connect((self.analog_sig_source_x_0, 0), (self.blocks_head_0, 0))
+        if record:
+            self.connect((self.blocks_head_0, 0), (self.blocks_file_sink_0, 0))
         self.connect((self.blocks_head_0, 0), (self.soapy_hackrf_sink_0, 0))
 
 
+    def get_record(self):
+        return self.record
+
+    def set_record(self, record):
+        self.record = record
+
+    def get_tone_freq(self):
+        return self.tone_freq
+
+    def set_tone_freq(self, tone_freq):
+        self.tone_freq = tone_freq
+        self.analog_sig_source_x_0.set_frequency(self.tone_freq)
+
+    def get_tone_ampl(self):
+        return self.tone_ampl
+
+    def set_tone_ampl(self, tone_ampl):
+        self.tone_ampl = tone_ampl
+        self.analog_sig_source_x_0.set_amplitude(self.tone_ampl)
+
+    def get_waveform(self):
+        return self.waveform
+
+    def set_waveform(self, waveform):
+        self.waveform = waveform
+
+    def write_reference_params(self, path):
+        # The transmitted signal is fully determined by these, so the exporter can regenerate it.
+        if self.waveform:
+            write_params(path, self.samp_rate, 0, 1, waveform=self.waveform)
+        else:
+            write_params(path, self.samp_rate, self.tone_freq, self.tone_ampl)
+
+    def get_buffered_sink(self):
+        return self.buffered_sink
+
+    def set_buffered_sink(self, buffered_sink):
+        self.buffered_sink = buffered_sink
+
     def get_samp_rate(self):
         return self.samp_rate
 
@@ -80,15 +150,69 @@ class TX(gr.top_block):
         self.center_freq = center_freq
         self.soapy_hackrf_sink_0.set_frequency(0, self.center_freq)
 
-
+    def get_vga_gain(self):
+        return self.vga_gain
+
+    def set_vga_gain(self, vga_gain):
+        self.vga_gain = vga_gain
+        self.soapy_hackrf_sink_0.set_gain(0, 'VGA', min(max(self.vga_gain, 0.0), 47.0))
+
+    def write_metadata(self, path, start_time):
+        write_meta(path, self.samp_rate, self.center_freq, start_time,
+                   gains={'AMP': 0, 'VGA': self.vga_gain},
+                   hw='HackRF One (Serial=2a7f8313)',
+                   description=(f'TX waveform {self.waveform}' if self.waveform
+                                else f'TX tone {self.tone_freq} Hz, amplitude {self.tone_ampl}'))
+
+
+
+
+def argument_parser():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--buffered-sink", dest="buffered_sink", type=intx, default=0,
+        help="Set write through the large-buffer background sink instead of the stock stdio-buffered file_sink (see bench_sink.py) [default=%(default)r]")
+    parser.add_argument(
+        "--record", dest="record", type=intx, default=1,
+        help="Set record TX samples to Data/txdata.dat (0 writes Data/txparams.json only) [default=%(default)r]")
+    parser.add_argument(
+        "--barrier", dest="barrier", type=str, default='',
+        help="Set start barrier pipe fds 'go,ready' to wait on after device open (empty starts immediately) [default=%(default)r]")
+    parser.add_argument(
+        "--vga-gain", dest="vga_gain", type=eng_float, default=eng_notation.num_to_str(float(25)),
+        help="Set TX VGA gain in dB, 0-47 [default=%(default)r]")
+    parser.add_argument(
+        "--waveform", dest="waveform", type=str, default='',
+        help="Set cached library waveform to loop (chirp, pn, multitone, ofdm; empty sends the tone) [default=%(default)r]")
+    parser.add_argument(
+        "--probe", dest="probe", type=intx, default=0,
+        help="Set run a short device health probe before opening the device for the capture [default=%(default)r]")
+    parser.add_argument(
+        "--profile", dest="profile", type=str, default='',
+        help="Set per-block performance counter report path (empty disables) [default=%(default)r]")
+    return parser
 
 
 def main(top_block_cls=TX, options=None):
-    tb = top_block_cls()
+    if options is None:
+        options = argument_parser().parse_args()
+    if options.probe:
+        probe_or_exit('tx', options.barrier)
+    tb = top_block_cls(buffered_sink=options.buffered_sink, record=options.record,
+                       vga_gain=options.vga_gain, waveform=options.waveform)
+    if not options.record:
+        tb.write_reference_params('Data/txparams.json')
+
+    wait_for_start(options.barrier)
+    start_time = time.time()
 
     def sig_handler(sig=None, frame=None):
         tb.stop()
         tb.wait()
+        if options.record:
+            tb.write_metadata('Data/txdata.sigmf-meta', start_time)
+        if options.profile:
+            write_block_report(options.profile, tb)
 
         sys.exit(0)
 
@@ -98,6 +222,10 @@ def main(top_block_cls=TX, options=None):
     tb.start()
 
     tb.wait()
+    if options.record:
+        tb.write_metadata('Data/txdata.sigmf-meta', start_time)
+    if options.profile:
+        write_block_report(options.profile, tb)
 
 
 if __name__ == '__main__':
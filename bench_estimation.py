@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+import tx_reference
+from capture_store import SAMP_RATE, store_cycle
+from channel_estimation import estimate_cycle
+from tx_reference import TX_PARAMS_FILE, load_params, synthesize, write_params
+
+NUM_SAMPLES = 50000000  # one full RX capture
+WRITE_CHUNK = 1 << 22
+
+
+def make_cycle(work_dir, num_samples, record_tx):
+    # A tone through a flat channel plus noise, archived like a real cycle.
+    params_path = os.path.join(work_dir, TX_PARAMS_FILE)
+    write_params(params_path, SAMP_RATE, 100000, 1)
+    params = load_params(params_path)
+    rx_path = os.path.join(work_dir, "rxdata.dat")
+    tx_path = os.path.join(work_dir, "txdata.dat")
+    rng = np.random.default_rng(0)
+    with open(rx_path, "wb") as rx_file, open(tx_path, "wb") as tx_file:
+        for start in range(0, num_samples, WRITE_CHUNK):
+            tx = synthesize(params, start, min(start + WRITE_CHUNK, num_samples))
+            noise = rng.standard_normal((len(tx), 2), dtype=np.float32).view(np.complex64)[:, 0]
+            (np.complex64(0.3 * np.exp(0.5j)) * tx + np.float32(0.01) * noise).tofile(rx_file)
+            if record_tx:
+                tx.tofile(tx_file)
+    if not record_tx:
+        os.remove(tx_path)
+        tx_path = params_path
+    return store_cycle(tx_path, rx_path, time.time(), SAMP_RATE, os.path.join(work_dir, "cycles"))
+
+
+def main():
+    parser = ArgumentParser(description="Time estimate_cycle over a synthetic full-length capture.")
+    parser.add_argument("--samples", type=int, default=NUM_SAMPLES)
+    parser.add_argument("--repeats", type=int, default=3)
+    options = parser.parse_args()
+
+    os.makedirs("Data", exist_ok=True)
+    capture_seconds = options.samples / SAMP_RATE
+    for record_tx in (False, True):
+        work_dir = tempfile.mkdtemp(prefix="bench-estimation-", dir="Data")
+        try:
+            cycle = make_cycle(work_dir, options.samples, record_tx)
+            best = float("inf")
+            for _ in range(options.repeats):
+                tx_reference._synthesize.cache_clear()
+                start = time.perf_counter()
+                estimate_cycle(cycle, os.path.join(work_dir, "cycles"))
+                best = min(best, time.perf_counter() - start)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        kind = "recorded TX" if record_tx else "regenerated TX"
+        print(f"{kind:<15} {best:8.3f} s for {capture_seconds:.1f} s of capture  "
+              f"{capture_seconds / best:6.2f}x real time  {options.samples / best / 1e6:8.2f} MS/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import os
+import time
+from argparse import ArgumentParser
+
+from gnuradio import blocks
+from gnuradio import gr
+
+from buffered_sink import buffered_file_sink
+
+BENCH_FILE = os.path.join("Data", "bench_sink.dat")
+NUM_SAMPLES = 50000000  # one full RX/TX capture
+
+
+def make_sink(kind, path, num_samples, direct_io):
+    if kind == "file_sink_unbuffered":
+        sink = blocks.file_sink(gr.sizeof_gr_complex*1, path, False)
+        sink.set_unbuffered(True)
+        return sink
+    if kind == "file_sink":
+        return blocks.file_sink(gr.sizeof_gr_complex*1, path, False)
+    return buffered_file_sink(path, direct_io=direct_io,
+                              preallocate_bytes=num_samples * gr.sizeof_gr_complex)
+
+
+def run_once(kind, path=BENCH_FILE, num_samples=NUM_SAMPLES, direct_io=False):
+    tb = gr.top_block()
+    source = blocks.null_source(gr.sizeof_gr_complex*1)
+    head = blocks.head(gr.sizeof_gr_complex*1, num_samples)
+    sink = make_sink(kind, path, num_samples, direct_io)
+    tb.connect(source, head, sink)
+
+    start = time.perf_counter()
+    tb.run()
+    elapsed = time.perf_counter() - start
+    os.remove(path)
+    return elapsed
+
+
+def main():
+    parser = ArgumentParser(description="Compare the stock file_sink against buffered_file_sink.")
+    parser.add_argument("--samples", type=int, default=NUM_SAMPLES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--direct-io", action="store_true")
+    options = parser.parse_args()
+
+    os.makedirs(os.path.dirname(BENCH_FILE), exist_ok=True)
+    megabytes = options.samples * gr.sizeof_gr_complex / 1e6
+    for kind in ("file_sink_unbuffered", "file_sink", "buffered_file_sink"):
+        best = min(run_once(kind, num_samples=options.samples, direct_io=options.direct_io)
+                   for _ in range(options.repeats))
+        print(f"{kind:<22} {best:8.3f} s  {megabytes / best:10.1f} MB/s  "
+              f"{options.samples / best / 1e6:8.2f} MS/s")
+
+
+if __name__ == "__main__":
+    main()
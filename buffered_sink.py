@@ -0,0 +1,122 @@
+import mmap
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+from gnuradio import gr
+
+BUFFER_BYTES = 16 << 20   # bytes per write(); a multiple of the page size
+QUEUE_DEPTH = 8           # buffers in flight between work() and the writer thread
+FSYNC_POLICIES = ("none", "close", "periodic")
+
+
+class buffered_file_sink(gr.sync_block):
+    """File sink that batches samples into large page-aligned buffers written by a background thread."""
+
+    def __init__(self, filename, dtype=np.complex64, buffer_bytes=BUFFER_BYTES, queue_depth=QUEUE_DEPTH,
+                 direct_io=False, preallocate_bytes=0, fsync_policy="close", fsync_period=1.0):
+        gr.sync_block.__init__(self, name="Buffered File Sink", in_sig=[dtype], out_sig=None)
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}")
+        if buffer_bytes % mmap.PAGESIZE:
+            raise ValueError(f"buffer_bytes must be a multiple of {mmap.PAGESIZE}")
+        self.filename = filename
+        self.buffer_bytes = buffer_bytes
+        self.queue_depth = queue_depth
+        self.direct_io = direct_io and hasattr(os, "O_DIRECT")
+        self.preallocate_bytes = preallocate_bytes
+        self.fsync_policy = fsync_policy
+        self.fsync_period = fsync_period
+        self._fd = None
+        self._thread = None
+
+    def start(self):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        if self.direct_io:
+            flags |= os.O_DIRECT
+        self._fd = os.open(self.filename, flags, 0o644)
+        if self.preallocate_bytes and hasattr(os, "posix_fallocate"):
+            os.posix_fallocate(self._fd, 0, self.preallocate_bytes)
+
+        # Anonymous mmaps are page aligned, which O_DIRECT requires.
+        self._free = queue.Queue()
+        for _ in range(self.queue_depth):
+            self._free.put(mmap.mmap(-1, self.buffer_bytes))
+        self._full = queue.Queue()
+        self._written = 0
+        self._error = None
+        self._take_buffer()
+
+        self._thread = threading.Thread(target=self._writer, name=f"writer:{self.filename}", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._thread is None:
+            return True
+        if self._fill:
+            self._full.put((self._buffer, self._fill))
+        self._full.put(None)
+        self._thread.join()
+        self._thread = None
+
+        if self.preallocate_bytes:
+            os.ftruncate(self._fd, self._written)
+        if self.fsync_policy != "none" and self._error is None:
+            os.fsync(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        if self._error is not None:
+            # A failure after the last work() call would otherwise go unnoticed.
+            print(f"{self.filename}: write failed after {self._written} bytes: {self._error!r}", file=sys.stderr)
+            return False
+        return True
+
+    def _take_buffer(self):
+        self._buffer = self._free.get()
+        self._view = np.frombuffer(self._buffer, dtype=np.uint8)
+        self._fill = 0
+
+    def _writer(self):
+        last_sync = time.monotonic()
+        try:
+            while True:
+                item = self._full.get()
+                if item is None:
+                    return
+                buffer, size = item
+                if size % mmap.PAGESIZE and self.direct_io:
+                    # The tail of the capture can't satisfy O_DIRECT's size alignment.
+                    import fcntl
+                    fcntl.fcntl(self._fd, fcntl.F_SETFL, fcntl.fcntl(self._fd, fcntl.F_GETFL) & ~os.O_DIRECT)
+                view = memoryview(buffer)[:size]
+                while view:
+                    view = view[os.write(self._fd, view):]
+                self._written += size
+                self._free.put(buffer)
+                if self.fsync_policy == "periodic" and time.monotonic() - last_sync >= self.fsync_period:
+                    os.fsync(self._fd)
+                    last_sync = time.monotonic()
+        except Exception as e:
+            self._error = e
+            # Keep work() from blocking forever on a buffer that will never come back.
+            for _ in range(self.queue_depth):
+                self._free.put(mmap.mmap(-1, self.buffer_bytes))
+
+    def work(self, input_items, output_items):
+        if self._error is not None:
+            raise self._error
+        data = input_items[0].view(np.uint8).reshape(-1)
+        pos = 0
+        while pos < len(data):
+            take = min(len(data) - pos, self.buffer_bytes - self._fill)
+            self._view[self._fill:self._fill + take] = data[pos:pos + take]
+            self._fill += take
+            pos += take
+            if self._fill == self.buffer_bytes:
+                self._full.put((self._buffer, self._fill))
+                self._take_buffer()
+        return len(input_items[0])
@@ -0,0 +1,266 @@
+import csv
+import json
+import os
+import shutil
+
+import numpy as np
+
+from sigmf_meta import meta_path, read_meta, sample_at, slice_meta, start_time as meta_start_time
+from tx_reference import is_params_file, load_params, shift_params, synthesize
+
+CYCLES_DIR = os.path.join("Data", "cycles")
+INDEX_FILE = "index.csv"
+INDEX_FIELDS = ["cycle", "start_time", "samp_rate", "num_samples", "tx_file", "rx_file"]
+SAMP_RATE = 10000000
+CHUNK_SAMPLES = 1 << 20  # samples per yielded chunk (8 MB of complex64 per stream)
+SAMPLE_SIZE = np.dtype(np.complex64).itemsize
+
+
+def _read_index(index_path):
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, newline='') as file:
+        rows = []
+        for row in csv.DictReader(file):
+            row["cycle"] = int(row["cycle"])
+            row["start_time"] = float(row["start_time"])
+            row["samp_rate"] = float(row["samp_rate"])
+            row["num_samples"] = int(row["num_samples"])
+            rows.append(row)
+        return rows
+
+
+def _append_index(index_path, row):
+    write_header = not os.path.exists(index_path)
+    with open(index_path, mode='a', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=INDEX_FIELDS)
+        if write_header:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def _write_index(index_path, rows):
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, mode='w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=INDEX_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, index_path)
+
+
+def _new_cycle(cycles_dir):
+    os.makedirs(cycles_dir, exist_ok=True)
+    index = _read_index(os.path.join(cycles_dir, INDEX_FILE))
+    cycle = index[-1]["cycle"] + 1 if index else 0
+    cycle_dir = os.path.join(cycles_dir, f"cycle_{cycle:06d}")
+    os.makedirs(cycle_dir, exist_ok=True)
+    return cycle, cycle_dir
+
+
+def _tx_name(tx_file_path):
+    # Cycles recorded without a TX file keep the TX parameters instead.
+    return "tx_params.json" if is_params_file(tx_file_path) else "tx.dat"
+
+
+def _store_meta(src_data_path, dst_data_path, start=None, stop=None):
+    # Carries a flowgraph's .sigmf-meta sidecar along with its data file.
+    src, dst = meta_path(src_data_path), meta_path(dst_data_path)
+    if not os.path.exists(src):
+        return None
+    if start is None:
+        os.replace(src, dst)
+        return read_meta(dst)
+    meta = slice_meta(read_meta(src), start, stop)
+    with open(dst, "w") as file:
+        json.dump(meta, file, indent=1)
+    return meta
+
+
+def _record_cycle(cycles_dir, cycle, tx_file, rx_file, start_time, samp_rate):
+    sizes = [os.path.getsize(path) for path in (tx_file, rx_file) if not is_params_file(path)]
+    num_samples = min(sizes) // SAMPLE_SIZE
+    _append_index(os.path.join(cycles_dir, INDEX_FILE), {
+        "cycle": cycle,
+        "start_time": start_time,
+        "samp_rate": samp_rate,
+        "num_samples": num_samples,
+        "tx_file": os.path.relpath(tx_file, cycles_dir),
+        "rx_file": os.path.relpath(rx_file, cycles_dir),
+    })
+    return cycle
+
+
+def store_cycle(tx_file_path, rx_file_path, start_time, samp_rate=SAMP_RATE, cycles_dir=CYCLES_DIR):
+    # Moves the raw .dat files of a finished cycle into its own directory so the
+    # next cycle can't overwrite them, then records the cycle in the index.
+    cycle, cycle_dir = _new_cycle(cycles_dir)
+    tx_file = os.path.join(cycle_dir, _tx_name(tx_file_path))
+    rx_file = os.path.join(cycle_dir, "rx.dat")
+    os.replace(tx_file_path, tx_file)
+    os.replace(rx_file_path, rx_file)
+    if not is_params_file(tx_file_path):
+        _store_meta(tx_file_path, tx_file)
+    rx_meta = _store_meta(rx_file_path, rx_file)
+    if rx_meta is not None:
+        # The flowgraph's own start timestamp beats the orchestrator's launch time.
+        start_time = meta_start_time(rx_meta)
+    return _record_cycle(cycles_dir, cycle, tx_file, rx_file, start_time, samp_rate)
+
+
+def store_span(tx_file_path, rx_file_path, start, stop, start_time, samp_rate=SAMP_RATE,
+               cycles_dir=CYCLES_DIR, rx_offset=None):
+    # Copies samples [start, stop) of a raw capture into a new cycle whose start
+    # time is shifted by the span offset, so time-range reads still line up.
+    # rx_offset is where the span starts in the RX file when that file holds
+    # only part of the capture, as a gated capture does.
+    cycle, cycle_dir = _new_cycle(cycles_dir)
+    tx_file = os.path.join(cycle_dir, _tx_name(tx_file_path))
+    rx_file = os.path.join(cycle_dir, "rx.dat")
+    copies = [(rx_file_path, rx_file, start if rx_offset is None else rx_offset)]
+    if is_params_file(tx_file_path):
+        with open(tx_file, "w") as file:
+            json.dump(shift_params(load_params(tx_file_path), start), file)
+    else:
+        copies.append((tx_file_path, tx_file, start))
+        _store_meta(tx_file_path, tx_file, start, stop)
+    rx_meta = _store_meta(rx_file_path, rx_file, start, stop)
+    for src, dst, offset in copies:
+        with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+            src_file.seek(offset * SAMPLE_SIZE)
+            remaining = stop - start
+            while remaining > 0:
+                data = np.fromfile(src_file, dtype=np.complex64, count=min(CHUNK_SAMPLES, remaining))
+                if not len(data):
+                    break
+                data.tofile(dst_file)
+                remaining -= len(data)
+    if rx_meta is not None:
+        start_time = meta_start_time(rx_meta)
+    else:
+        start_time += start / samp_rate
+    return _record_cycle(cycles_dir, cycle, tx_file, rx_file, start_time, samp_rate)
+
+
+def _dir_bytes(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def prune_cycles(max_bytes, cycles_dir=CYCLES_DIR):
+    # Deletes the oldest cycles until the archive fits in max_bytes; the newest
+    # cycle is always kept. Returns the removed cycle numbers.
+    index_path = os.path.join(cycles_dir, INDEX_FILE)
+    index = _read_index(index_path)
+    sizes = []
+    for row in index:
+        cycle_dir = os.path.join(cycles_dir, os.path.dirname(row["rx_file"]))
+        sizes.append(_dir_bytes(cycle_dir) if os.path.isdir(cycle_dir) else 0)
+    total = sum(sizes)
+    keep_from = 0
+    while keep_from < len(index) - 1 and total > max_bytes:
+        total -= sizes[keep_from]
+        keep_from += 1
+    if not keep_from:
+        return []
+    removed = index[:keep_from]
+    # Index first, so a crash part-way leaves orphan directories rather than
+    # index rows pointing at missing files.
+    _write_index(index_path, index[keep_from:])
+    for row in removed:
+        shutil.rmtree(os.path.join(cycles_dir, os.path.dirname(row["rx_file"])), ignore_errors=True)
+    return [row["cycle"] for row in removed]
+
+
+def time_to_sample(t, origin, rate):
+    # Nearest sample to time t in a stream starting at origin, as sigmf_meta.sample_at
+    # does. Truncating turned 1 ms into 9999 samples; an epoch timestamp only
+    # resolves about 0.24 us, so no fixed epsilon can make flooring exact.
+    return int(round((t - origin) * rate))
+
+
+def _read_samples(file_path, start, count):
+    with open(file_path, "rb") as file:
+        file.seek(start * SAMPLE_SIZE)
+        return np.fromfile(file, dtype=np.complex64, count=count)
+
+
+class CaptureReader:
+    """Lazy, chunked access to the cycles archived by store_cycle."""
+
+    def __init__(self, cycles_dir=CYCLES_DIR, chunk_samples=CHUNK_SAMPLES):
+        self.cycles_dir = cycles_dir
+        self.chunk_samples = chunk_samples
+
+    def cycles(self):
+        return _read_index(os.path.join(self.cycles_dir, INDEX_FILE))
+
+    def cycle_info(self, cycle):
+        for row in self.cycles():
+            if row["cycle"] == cycle:
+                return row
+        raise KeyError(f"No such cycle: {cycle}")
+
+    def path(self, info, stream):
+        return os.path.join(self.cycles_dir, info[f"{stream}_file"])
+
+    def metadata(self, cycle, stream="rx"):
+        # The .sigmf-meta sidecar of a stream, or None for captures recorded without one.
+        path = meta_path(self.path(self.cycle_info(cycle), stream))
+        return read_meta(path) if os.path.exists(path) else None
+
+    def sample_at(self, cycle, timestamp, stream="rx"):
+        meta = self.metadata(cycle, stream)
+        if meta is not None:
+            return sample_at(meta, timestamp)
+        info = self.cycle_info(cycle)
+        return time_to_sample(timestamp, info["start_time"], info["samp_rate"])
+
+    def read(self, cycle, start=0, stop=None):
+        info = self.cycle_info(cycle)
+        start, stop = self._clip(info, start, stop)
+        return (self._read_tx(info, start, stop),
+                _read_samples(self.path(info, "rx"), start, stop - start))
+
+    def _read_tx(self, info, start, stop):
+        path = self.path(info, "tx")
+        if is_params_file(path):
+            return synthesize(load_params(path), start, stop)
+        return _read_samples(path, start, stop - start)
+
+    def iter_chunks(self, cycle, start=0, stop=None, with_tx=True):
+        # Yields (offset, tx, rx) with at most chunk_samples per array, so memory
+        # use is bounded by the chunk size regardless of the capture length.
+        # Without with_tx, tx is None and the TX stream is neither read nor synthesized.
+        return self._iter_chunks(self.cycle_info(cycle), start, stop, with_tx)
+
+    def _iter_chunks(self, info, start, stop, with_tx=True):
+        start, stop = self._clip(info, start, stop)
+        with open(self.path(info, "rx"), "rb") as rx_file:
+            rx_file.seek(start * SAMPLE_SIZE)
+            offset = start
+            while offset < stop:
+                count = min(self.chunk_samples, stop - offset)
+                rx = np.fromfile(rx_file, dtype=np.complex64, count=count)
+                tx = self._read_tx(info, offset, offset + count) if with_tx else None
+                yield offset, tx, rx
+                offset += count
+
+    def iter_time_range(self, t_start, t_stop):
+        # Yields (cycle, offset, tx, rx) for every sample captured in the wall-clock
+        # interval [t_start, t_stop).
+        for info in self.cycles():
+            rate = info["samp_rate"]
+            cycle_start = info["start_time"]
+            cycle_stop = cycle_start + info["num_samples"] / rate
+            if cycle_stop <= t_start or cycle_start >= t_stop:
+                continue
+            start = max(0, time_to_sample(t_start, cycle_start, rate))
+            stop = min(info["num_samples"], time_to_sample(t_stop, cycle_start, rate))
+            for offset, tx, rx in self._iter_chunks(info, start, stop):
+                yield info["cycle"], offset, tx, rx
+
+    @staticmethod
+    def _clip(info, start, stop):
+        num_samples = info["num_samples"]
+        stop = num_samples if stop is None else min(stop, num_samples)
+        start = max(0, min(start, stop))
+        return start, stop
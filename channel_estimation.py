@@ -0,0 +1,103 @@
+import os
+
+import numpy as np
+
+from capture_store import CYCLES_DIR, CaptureReader
+
+EST_BLOCK = 4096  # paired samples per estimate
+DEROTATE_SPLIT = 64  # inner length of the factored CFO derotation
+ESTIMATES_FILE = "estimates.npy"
+ESTIMATE_DTYPE = np.dtype([
+    ("time", np.float64),       # seconds since the epoch at the block centre
+    ("gain_db", np.float32),    # 20*log10|h| of the least-squares channel h
+    ("phase", np.float32),      # angle(h) in radians
+    ("cfo_hz", np.float32),     # residual carrier frequency offset
+    ("noise_db", np.float32),   # residual power after removing h*tx, dBFS
+    ("snr_db", np.float32),
+])
+
+
+def _derotated_sum(z, omega):
+    # sum_n z[k, n] * exp(-j*omega[k]*n) per block k. With n = a*S + b the
+    # rotation factors into exp(-j*omega*S*a) * exp(-j*omega*b), so it costs a
+    # batched matrix product instead of a complex exp per sample.
+    blocks, block_size = z.shape
+    if block_size % DEROTATE_SPLIT:
+        n = np.arange(block_size)
+        return np.sum(z * np.exp(-1j * omega[:, None] * n).astype(np.complex64), axis=1, dtype=np.complex128)
+    outer = np.exp(-1j * omega[:, None] * DEROTATE_SPLIT * np.arange(block_size // DEROTATE_SPLIT))
+    inner = np.exp(-1j * omega[:, None] * np.arange(DEROTATE_SPLIT)).astype(np.complex64)
+    partial = np.matmul(z.reshape(blocks, -1, DEROTATE_SPLIT), inner[:, :, None])[:, :, 0]
+    return np.sum(partial * outer, axis=1)
+
+
+def estimate_blocks(tx, rx, samp_rate, block_size=EST_BLOCK):
+    # Per-block estimates over the full blocks of a pair of equal-length arrays.
+    n = min(len(tx), len(rx)) // block_size * block_size
+    x = tx[:n].reshape(-1, block_size)
+    y = rx[:n].reshape(-1, block_size)
+
+    # z = rx*conj(tx) feeds both the CFO estimate and the least-squares fit.
+    z = y * np.conj(x)
+    x_power = np.sum(x.real * x.real + x.imag * x.imag, axis=1, dtype=np.float64)
+    y_power = np.sum(y.real * y.real + y.imag * y.imag, axis=1, dtype=np.float64)
+
+    # Phase advance per sample of rx*conj(tx) gives the frequency offset. It is
+    # removed before the fit: two free-running HackRFs are kHz apart, enough to
+    # rotate z through many turns within a block and cancel the sum.
+    rotation = np.sum(z[:, 1:] * np.conj(z[:, :-1]), axis=1, dtype=np.complex128)
+    cfo = np.angle(rotation) * samp_rate / (2 * np.pi)
+    cross = _derotated_sum(z, 2 * np.pi * cfo / samp_rate)
+    h = cross / np.maximum(x_power, 1e-20)
+
+    # ||y - h*r*x||^2 = ||y||^2 - |<y, r*x>|^2 / ||x||^2 for the least-squares h
+    # and the unit-modulus rotation r, so the residual never has to be formed.
+    signal_energy = np.abs(cross) ** 2 / np.maximum(x_power, 1e-20)
+    noise = np.maximum(y_power - signal_energy, 0.0) / block_size
+    signal = signal_energy / block_size
+
+    out = np.empty(len(h), dtype=ESTIMATE_DTYPE)
+    out["gain_db"] = 20 * np.log10(np.maximum(np.abs(h), 1e-10))
+    out["phase"] = np.angle(h)
+    out["cfo_hz"] = cfo
+    out["noise_db"] = 10 * np.log10(np.maximum(noise, 1e-20))
+    out["snr_db"] = 10 * np.log10(np.maximum(signal, 1e-20) / np.maximum(noise, 1e-20))
+    # A silent reference (a channel the tone isn't in) has no channel to estimate;
+    # noise_db is then just the RX power.
+    silent = x_power == 0
+    for field in ("gain_db", "phase", "cfo_hz", "snr_db"):
+        out[field][silent] = np.nan
+    return out
+
+
+def estimate_cycle(cycle, cycles_dir=CYCLES_DIR, block_size=EST_BLOCK):
+    reader = CaptureReader(cycles_dir, chunk_samples=block_size * 256)
+    info = reader.cycle_info(cycle)
+    rate = info["samp_rate"]
+
+    estimates = []
+    for offset, tx, rx in reader.iter_chunks(cycle):
+        est = estimate_blocks(tx, rx, rate, block_size)
+        centres = offset + np.arange(len(est)) * block_size + block_size / 2
+        est["time"] = info["start_time"] + centres / rate
+        estimates.append(est)
+
+    estimates = np.concatenate(estimates) if estimates else np.empty(0, dtype=ESTIMATE_DTYPE)
+    np.save(os.path.join(cycles_dir, f"cycle_{cycle:06d}", ESTIMATES_FILE), estimates)
+    return estimates
+
+
+def load_estimates(cycles_dir=CYCLES_DIR, t_start=None, t_stop=None):
+    # Concatenated time series across every cycle that has estimates.
+    series = []
+    for info in CaptureReader(cycles_dir).cycles():
+        path = os.path.join(cycles_dir, f"cycle_{info['cycle']:06d}", ESTIMATES_FILE)
+        if not os.path.exists(path):
+            continue
+        est = np.load(path)
+        if t_start is not None:
+            est = est[est["time"] >= t_start]
+        if t_stop is not None:
+            est = est[est["time"] < t_stop]
+        series.append(est)
+    return np.concatenate(series) if series else np.empty(0, dtype=ESTIMATE_DTYPE)
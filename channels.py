@@ -0,0 +1,19 @@
+# Filter design shared by RX.py and the reference derivation, so the regenerated
+# TX reference keeps exactly the band the recorded RX kept.
+DECIMATION_CUTOFF = 0.4       # low-pass cutoff before decimation, as a fraction of the output rate
+DECIMATION_TRANSITION = 0.1
+CHANNEL_CUTOFF = 0.45         # PFB prototype cutoff, as a fraction of the channel rate
+CHANNEL_TRANSITION = 0.1
+CHANNEL_ATTENUATION = 80      # dB
+
+
+def channel_offset(chan, samp_rate, num_chans):
+    # Centre of PFB output chan relative to the RX centre frequency; channels
+    # above num_chans / 2 wrap to negative offsets.
+    if chan >= num_chans / 2:
+        chan -= num_chans
+    return chan * samp_rate / num_chans
+
+
+def in_passband(frequency, cutoff):
+    return abs(frequency) <= cutoff
@@ -0,0 +1,133 @@
+import os
+import time
+
+import numpy as np
+
+TEST_FILE = ".disk_selftest.dat"
+TEST_BYTES = 1 << 30          # enough to get past the page cache on most machines
+TEST_BLOCK = 16 << 20
+HEADROOM = 0.8                # use at most this fraction of the measured bandwidth
+SHORTFALL = 0.9               # a stream writing below this fraction of its rate is falling behind
+POLL_INTERVAL = 0.5           # seconds between write-progress samples
+SAMPLE_BYTES = np.dtype(np.complex64).itemsize
+
+
+def measure_write_bandwidth(directory, total_bytes=TEST_BYTES, block_bytes=TEST_BLOCK):
+    # Sustained sequential write bandwidth in bytes/s, fsync included.
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, TEST_FILE)
+    block = np.random.default_rng().integers(0, 256, block_bytes, dtype=np.uint8).tobytes()
+    start = time.perf_counter()
+    try:
+        with open(path, "wb", buffering=0) as file:
+            written = 0
+            while written < total_bytes:
+                written += file.write(block)
+            os.fsync(file.fileno())
+        return written / (time.perf_counter() - start)
+    finally:
+        os.remove(path)
+
+
+class CaptureMode:
+
+    def __init__(self, name, tx_record, decimation, window):
+        self.name = name
+        self.tx_record = tx_record
+        self.decimation = decimation
+        self.window = window  # fraction of the full capture length kept
+
+    def write_rate(self, samp_rate):
+        streams = 2 if self.tx_record else 1
+        return streams * samp_rate / self.decimation * SAMPLE_BYTES
+
+    def __str__(self):
+        return (f"{self.name} (TX {'recorded' if self.tx_record else 'regenerated'}, "
+                f"RX decimation {self.decimation}, {self.window:.0%} window)")
+
+
+def capture_modes(tx_record, decimate=True):
+    # Ordered from most to least disk-hungry. Without decimate, only full-rate
+    # modes are offered (a library TX waveform can't be regenerated decimated).
+    modes = []
+    if tx_record:
+        modes.append(CaptureMode("full", True, 1, 1.0))
+    modes.append(CaptureMode("tx-regenerated", False, 1, 1.0))
+    if decimate:
+        modes += [
+            CaptureMode("decimate-2", False, 2, 1.0),
+            CaptureMode("decimate-4", False, 4, 1.0),
+            CaptureMode("decimate-4-short", False, 4, 0.5),
+        ]
+    else:
+        modes.append(CaptureMode("short", False, 1, 0.5))
+    return modes
+
+
+def process_write_bytes(pid):
+    # Bytes the process has passed to write(); None where /proc is unavailable.
+    try:
+        with open(f"/proc/{pid}/io") as file:
+            for line in file:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def watch_writes(procs, runtime):
+    # Sleeps for runtime while sampling how fast the flowgraphs write. Returns the
+    # achieved rate (bytes/s) over the span where writes were growing, or None if
+    # it can't be measured.
+    first = None
+    last = None
+    deadline = time.monotonic() + runtime
+    while time.monotonic() < deadline:
+        time.sleep(min(POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+        counts = [process_write_bytes(proc.pid) for proc in procs]
+        if any(count is None for count in counts):
+            return None
+        total = sum(counts)
+        now = time.monotonic()
+        # Imports and device open write nothing, and head stops the writes early;
+        # only the span between the first and last growth counts.
+        if first is None:
+            if total > 0:
+                first = last = (now, total)
+        elif total > last[1]:
+            last = (now, total)
+    if first is None or last[0] <= first[0]:
+        return None
+    return (last[1] - first[1]) / (last[0] - first[0])
+
+
+class BackpressureController:
+    """Steps down through capture_modes when the disk can't keep up, reporting each change."""
+
+    def __init__(self, modes, samp_rate, bandwidth=None):
+        self.modes = modes
+        self.samp_rate = samp_rate
+        self.index = 0
+        if bandwidth is not None:
+            while self.index < len(modes) - 1 and self.mode.write_rate(samp_rate) > bandwidth * HEADROOM:
+                self.index += 1
+            if self.index:
+                self._report(f"self-test measured {bandwidth / 1e6:.0f} MB/s")
+
+    @property
+    def mode(self):
+        return self.modes[self.index]
+
+    def observe(self, achieved_rate):
+        if achieved_rate is None:
+            return
+        required = self.mode.write_rate(self.samp_rate)
+        lag = (required - achieved_rate) / required
+        print(f"Disk write rate {achieved_rate / 1e6:.0f} MB/s of {required / 1e6:.0f} MB/s required.")
+        if achieved_rate < required * SHORTFALL and self.index < len(self.modes) - 1:
+            self.index += 1
+            self._report(f"writes fell {lag:.0%} behind")
+
+    def _report(self, reason):
+        print(f"Backpressure: {reason}, switching to capture mode {self.mode}.")
@@ -0,0 +1,123 @@
+import numpy as np
+
+CLIP_LEVEL = 127 / 128        # HackRF's 8-bit ADC full scale after soapy's scaling to +/-1
+CLIP_LIMIT = 1e-4             # fraction of clipped samples above which gain is backed off
+CLIP_BACKOFF_DB = 6.0         # gain removed per cycle while clipping
+SNR_TARGET_DB = 20.0          # below this, and with no clipping, gain is raised
+HEADROOM_DB = 6.0             # peak level kept below full scale when raising gain
+MEASURE_CHUNK = 1 << 20       # samples read per step
+FFT_SIZE = 1024
+FFT_BLOCKS = 32               # spectra averaged per chunk for the SNR estimate
+NOISE_PERCENTILE = 10         # spectral bins below this are taken as the noise floor
+
+# (name, minimum, maximum, step) as the HackRF accepts them.
+RX_LNA = ("lna_gain", 0, 40, 8)
+RX_VGA = ("rx_vga_gain", 0, 62, 2)
+TX_VGA = ("tx_vga_gain", 0, 47, 1)
+
+
+def measure_capture(path, chunk_samples=MEASURE_CHUNK):
+    # Clip fraction, peak level in dBFS and a blind SNR estimate for a capture.
+    # A component sitting at the ADC rail counts as clipped; the SNR compares the
+    # averaged spectrum against its low-percentile noise floor, so it needs no
+    # reference and works for tones and wideband waveforms that leave some band free.
+    clipped = 0
+    total = 0
+    peak = 0.0
+    spectrum = np.zeros(FFT_SIZE)
+    spectra = 0
+    with open(path, "rb") as file:
+        while True:
+            x = np.fromfile(file, dtype=np.complex64, count=chunk_samples)
+            if not len(x):
+                break
+            rail = (np.abs(x.real) >= CLIP_LEVEL) | (np.abs(x.imag) >= CLIP_LEVEL)
+            clipped += np.count_nonzero(rail)
+            total += len(x)
+            peak = max(peak, float(np.max(np.abs(x))))
+
+            blocks = min(len(x) // FFT_SIZE, FFT_BLOCKS)
+            if blocks:
+                frames = x[:blocks * FFT_SIZE].reshape(blocks, FFT_SIZE) * np.hanning(FFT_SIZE)
+                power = np.abs(np.fft.fft(frames, axis=1)) ** 2
+                spectrum += power.sum(axis=0)
+                spectra += blocks
+
+    if not total:
+        return None
+    snr_db = None
+    if spectra:
+        spectrum /= spectra
+        noise = np.percentile(spectrum, NOISE_PERCENTILE)
+        signal = np.sum(np.maximum(spectrum - noise, 0.0))
+        snr_db = float(10 * np.log10(max(signal, 1e-20) / max(noise * FFT_SIZE, 1e-20)))
+    return {
+        "clip_fraction": clipped / total,
+        "peak_dbfs": float(20 * np.log10(max(peak, 1e-10))),
+        "snr_db": snr_db,
+    }
+
+
+def combine_measurements(measurements):
+    # Channelized cycles give one measurement per channel: the worst clipping
+    # and the best SNR decide, so an idle channel doesn't pull the gain up.
+    measurements = [m for m in measurements if m is not None]
+    if not measurements:
+        return None
+    snrs = [m["snr_db"] for m in measurements if m["snr_db"] is not None]
+    return {
+        "clip_fraction": max(m["clip_fraction"] for m in measurements),
+        "peak_dbfs": max(m["peak_dbfs"] for m in measurements),
+        "snr_db": max(snrs) if snrs else None,
+    }
+
+
+class GainController:
+    """Adjusts RX LNA/VGA and TX VGA between cycles from each capture's clipping and SNR."""
+
+    def __init__(self, lna_gain=40, rx_vga_gain=0, tx_vga_gain=25):
+        self.gains = {"lna_gain": lna_gain, "rx_vga_gain": rx_vga_gain, "tx_vga_gain": tx_vga_gain}
+
+    def rx_args(self):
+        return ["--lna-gain", str(self.gains["lna_gain"]), "--vga-gain", str(self.gains["rx_vga_gain"])]
+
+    def tx_args(self):
+        return ["--vga-gain", str(self.gains["tx_vga_gain"])]
+
+    def observe(self, measurement):
+        if measurement is None:
+            return
+        clip = measurement["clip_fraction"]
+        snr = measurement["snr_db"]
+        snr_text = "n/a" if snr is None else f"{snr:.1f} dB"
+        print(f"RX level: {clip:.2e} clipped, peak {measurement['peak_dbfs']:.1f} dBFS, SNR {snr_text}.")
+
+        if clip > CLIP_LIMIT:
+            # Back off at the receiver first, baseband before RF, and only then
+            # turn the transmitter down.
+            self._adjust(-CLIP_BACKOFF_DB, (RX_VGA, RX_LNA, TX_VGA), f"clipping {clip:.2e}")
+        elif snr is not None and snr < SNR_TARGET_DB:
+            # Raise the transmitter first, since that improves SNR rather than just
+            # scaling the noise, but never past the peak headroom.
+            room = -HEADROOM_DB - measurement["peak_dbfs"]
+            if room > 0:
+                self._adjust(min(SNR_TARGET_DB - snr, room), (TX_VGA, RX_LNA, RX_VGA), f"SNR {snr:.1f} dB")
+
+    def _adjust(self, delta_db, order, reason):
+        # Spreads delta_db over the stages in order, each in its own step size.
+        before = dict(self.gains)
+        direction = np.sign(delta_db)
+        for name, low, high, step in order:
+            current = self.gains[name]
+            steps = int(delta_db / step)  # towards zero, so gain is never overshot
+            if delta_db < 0 and not steps:
+                steps = -1  # a backoff always moves at least one step
+            target = min(max(current + steps * step, low), high)
+            self.gains[name] = target
+            delta_db -= target - current
+            if abs(delta_db) < 1 or np.sign(delta_db) != direction:
+                break
+        if self.gains != before:
+            changes = ", ".join(f"{name} {before[name]}->{self.gains[name]}"
+                                for name in self.gains if self.gains[name] != before[name])
+            print(f"Gain control: {reason}, {changes}.")
@@ -7,12 +7,50 @@ import signal
 import platform
 import numpy as np
 import csv
+import shutil
+import tempfile
+from argparse import ArgumentParser
+
+from capture_store import CYCLES_DIR, SAMP_RATE, SAMPLE_SIZE, prune_cycles, store_cycle, store_span
+from channel_estimation import estimate_cycle
+from channels import CHANNEL_CUTOFF, DECIMATION_CUTOFF, channel_offset
+from disk_check import BackpressureController, capture_modes, measure_write_bandwidth, watch_writes
+from gain_control import GainController, combine_measurements, measure_capture
+from profiling import PERF_COUNTERS_ENV, PROFILE_DIR, StageProfiler
+from replay import replay
+from shards import SHARDS_DIR, export_shards, prune_shards
+from sigmf_meta import meta_path
+from start_barrier import StartBarrier
+from summary import build_summary
+from trigger import capture_length, duty_cycle, find_active_windows, gated_offset, read_windows, windows_path
+from tx_reference import TX_PARAMS_FILE, derive_params, is_params_file, load_params, synthesize
 
 DATA_DIR = "Data/"
 TX_SCRIPT = "TX.py"
 RX_SCRIPT = "RX.py"
 CSV_FILE_PATH = os.path.join(DATA_DIR, "signal.csv")
+CSV_EXPORT_SAMPLES = 500000  # most recent samples appended to the CSV per capture
 RUNTIME_SECONDS = 10  # duration to run TX/RX per cycle
+CAPTURE_SAMPLES = 50000000  # RX input samples per cycle, before decimation
+RX_CHANNELS = ""  # comma-separated PFB channels to record instead of the full band, e.g. "0,3"
+RX_NUM_CHANS = 8  # channels the band is split into; each runs at SAMP_RATE / RX_NUM_CHANS
+START_BARRIER = platform.system() != "Windows"  # start TX and RX streaming together (needs fd passing)
+BARRIER_TIMEOUT = 20  # seconds both flowgraphs get to import GNU Radio, probe and open their device
+GAIN_CONTROL = True  # adjust RX LNA/VGA and TX VGA between cycles from clipping and SNR
+DISK_SELFTEST = True  # measure DATA_DIR write bandwidth at startup and adapt the capture mode
+TERMINATE_TIMEOUT = 10  # seconds a flowgraph gets to flush and exit after SIGTERM
+PROBE_ENABLED = True  # short capture in each flowgraph before it opens its device for the cycle
+RECOVERY_COMMAND = []  # e.g. a USB reset for the HackRFs; run after a failed probe
+RECOVERY_DELAY = 2  # seconds to wait after a failed probe before the next cycle
+ARCHIVE_MAX_BYTES = 50 << 30  # oldest archived cycles are deleted beyond this; None keeps everything
+SHARDS_ENABLED = False  # also cut each capture into float32 .npy windows for the model
+TX_WAVEFORM = ""  # library waveform for TX to loop (see waveforms.WAVEFORMS); empty sends the tone
+TX_RECORD = True  # False records only the TX parameters and regenerates the reference on export
+TRIGGER_ENABLED = False  # RX.py writes only windows whose energy crosses the threshold
+TRIGGER_THRESHOLD_DB = -30.0  # mean block power in dBFS
+TRIGGER_PRE_SECONDS = 0.001  # context kept before the first active block
+TRIGGER_POST_SECONDS = 0.001  # context kept after the last active block
+TRIGGER_SPLIT_MAX_DUTY = 0.5  # replays: above this the capture is archived whole; copying the windows would write more
 
 # TO DO
 # - Fix: "sink :warning: Soapy sink error: TIMEOUT"
@@ -25,11 +63,12 @@ def install_requirements():
         print("Failed to install some packages. Continuing anyway...")
 
 
-def run_flowgraph(script_path):
+def run_flowgraph(script_path, *args, env=None, pass_fds=()):
     if platform.system() == "Windows":
-        return subprocess.Popen(["python", script_path])
+        return subprocess.Popen(["python", script_path, *args], env=env)
     else:
-        return subprocess.Popen(["python3", script_path], preexec_fn=os.setsid)
+        return subprocess.Popen(["python3", script_path, *args], env=env, pass_fds=pass_fds,
+                                preexec_fn=os.setsid)
 
 
 def terminate_process(proc):
@@ -37,14 +76,75 @@ def terminate_process(proc):
         proc.terminate()
     else:
         os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
+    # The buffered sinks flush their last buffers on stop, so wait before reading.
+    try:
+        proc.wait(timeout=TERMINATE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def recover_devices():
+    if RECOVERY_COMMAND:
+        print(f"Running recovery: {' '.join(RECOVERY_COMMAND)}")
+        subprocess.call(RECOVERY_COMMAND)
+    time.sleep(RECOVERY_DELAY)
+
+
+def capture_is_valid(file_path):
+    # A gated capture is legitimately empty when nothing crossed the threshold.
+    if not os.path.exists(file_path) or (os.path.getsize(file_path) == 0
+                                         and not os.path.exists(windows_path(file_path))):
+        print(f"{file_path} is missing or empty.")
+        return False
+    return True
 
 
-def save_to_csv(rx_file_path, tx_file_path, csv_file_path):
-    rx_data = np.fromfile(open(rx_file_path), dtype=np.complex64)
-    tx_data = np.fromfile(open(tx_file_path), dtype=np.complex64)
+def remove_capture(file_path):
+    for path in (file_path, meta_path(file_path), windows_path(file_path)):
+        if os.path.exists(path):
+            os.remove(path)
 
-    tx_data_last = tx_data[-500000:] if len(tx_data) >= 500000 else tx_data
-    rx_data_last = rx_data[-500000:] if len(rx_data) >= 500000 else rx_data
+
+def export_ranges(num_samples, windows=None, limit=CSV_EXPORT_SAMPLES):
+    # The [start, stop) spans holding the last limit samples of the capture, or
+    # of its active windows when the trigger found some.
+    if windows is None:
+        windows = [(0, num_samples)]
+    ranges = []
+    for start, stop in reversed(windows):
+        take = min(stop - start, limit)
+        ranges.append((stop - take, stop))
+        limit -= take
+        if not limit:
+            break
+    return ranges[::-1]
+
+
+def read_range(file_path, start, stop):
+    with open(file_path, "rb") as file:
+        file.seek(start * SAMPLE_SIZE)
+        return np.fromfile(file, dtype=np.complex64, count=stop - start)
+
+
+def save_to_csv(rx_file_path, tx_file_path, csv_file_path, windows=None, gated=False):
+    # TX and RX are paired sample for sample, as in the capture store. A gated
+    # RX file holds only the windows, back to back, so its reads are remapped.
+    if gated:
+        ranges = export_ranges(windows[-1][1], windows)
+        rx_ranges = [(gated_offset(windows, start), gated_offset(windows, start) + stop - start)
+                     for start, stop in ranges]
+    else:
+        ranges = rx_ranges = export_ranges(capture_length(rx_file_path), windows)
+    rx_data_last = np.concatenate([read_range(rx_file_path, start, stop) for start, stop in rx_ranges])
+
+    if is_params_file(tx_file_path):
+        params = load_params(tx_file_path)
+        tx_data_last = np.concatenate([synthesize(params, start, stop) for start, stop in ranges])
+    else:
+        tx_data_last = np.concatenate([read_range(tx_file_path, start, stop) for start, stop in ranges])
+    if len(tx_data_last) < len(rx_data_last):
+        tx_data_last = np.concatenate((tx_data_last, np.zeros(len(rx_data_last) - len(tx_data_last), np.complex64)))
 
     write_header = not os.path.exists(csv_file_path)
 
@@ -53,41 +153,284 @@ def save_to_csv(rx_file_path, tx_file_path, csv_file_path):
         if write_header:
             writer.writerow(["Index", "TX Real", "TX Imag", "TX Magnitude", "RX Real", "RX Imag", "RX Magnitude"])
 
-        for i in range(len(tx_data_last)):
-            tx = tx_data_last[i]
-            rx = rx_data_last[i] if i < len(rx_data_last) else 0
-            writer.writerow([
-                i,
-                np.real(tx), np.imag(tx), np.abs(tx),
-                np.real(rx), np.imag(rx), np.abs(rx)
-            ])
+        writer.writerows(zip(
+            range(len(rx_data_last)),
+            tx_data_last.real, tx_data_last.imag, np.abs(tx_data_last),
+            rx_data_last.real, rx_data_last.imag, np.abs(rx_data_last)))
+
+
+def channel_list():
+    return [int(c) for c in RX_CHANNELS.split(",") if c.strip()]
+
+
+def channel_captures(tx_params_path):
+    # One capture per recorded channel, each paired with the TX tone as it
+    # appears in that channel; channels the tone doesn't fall in get a silent reference.
+    captures = []
+    for chan in channel_list():
+        rx_path = os.path.join(DATA_DIR, f"rxdata_ch{chan}.dat")
+        tx_path = os.path.join(DATA_DIR, f"txparams_ch{chan}.json")
+        derive_params(tx_params_path, tx_path, RX_NUM_CHANS, channel_offset(chan, SAMP_RATE, RX_NUM_CHANS),
+                      CHANNEL_CUTOFF * SAMP_RATE / RX_NUM_CHANS)
+        captures.append((rx_path, tx_path, SAMP_RATE / RX_NUM_CHANS))
+    os.remove(tx_params_path)
+    return captures
+
+
+def process_capture(rx_file_path, tx_file_path, start_time, profiler, samp_rate=SAMP_RATE,
+                    cycles_dir=CYCLES_DIR, shards_dir=SHARDS_DIR, csv_file_path=CSV_FILE_PATH):
+    # Everything after the flowgraphs stop: trigger, export, archive and the
+    # per-capture products. Returns the archived cycle numbers.
+    windows = None
+    split = gated = os.path.exists(windows_path(rx_file_path))
+    if gated:
+        # RX.py gated the capture while streaming; the file holds only the windows.
+        windows, num_samples = read_windows(windows_path(rx_file_path))
+    elif TRIGGER_ENABLED:
+        # Recordings replayed from disk were never gated, so detect after the fact.
+        with profiler.stage("trigger"):
+            windows = find_active_windows(rx_file_path, TRIGGER_THRESHOLD_DB,
+                                          pre_samples=int(TRIGGER_PRE_SECONDS * samp_rate),
+                                          post_samples=int(TRIGGER_POST_SECONDS * samp_rate))
+        num_samples = capture_length(rx_file_path)
+        # The whole capture is already on disk; copying the windows out only
+        # saves space when they are a small part of it.
+        split = duty_cycle(windows, num_samples) <= TRIGGER_SPLIT_MAX_DUTY
+    if windows is not None:
+        print(f"Trigger found {len(windows)} active windows ({duty_cycle(windows, num_samples):.1%} duty cycle).")
+        if not windows:
+            remove_capture(rx_file_path)
+            remove_capture(tx_file_path)
+            print("No activity, cycle discarded.")
+            return []
+
+    print("Saving to CSV...")
+    with profiler.stage("export"):
+        save_to_csv(rx_file_path, tx_file_path, csv_file_path, windows, gated)
+
+    print("Archiving cycle...")
+    with profiler.stage("archive"):
+        if split:
+            cycles = [store_span(tx_file_path, rx_file_path, start, stop, start_time, samp_rate, cycles_dir,
+                                 rx_offset=gated_offset(windows, start) if gated else None)
+                      for start, stop in windows]
+            remove_capture(rx_file_path)
+            remove_capture(tx_file_path)
+        else:
+            cycles = [store_cycle(tx_file_path, rx_file_path, start_time, samp_rate, cycles_dir)]
+    for cycle in cycles:
+        with profiler.stage("summary"):
+            build_summary(cycle, cycles_dir)
+        with profiler.stage("estimate"):
+            estimate_cycle(cycle, cycles_dir)
+        if SHARDS_ENABLED:
+            with profiler.stage("shards"):
+                export_shards(cycle, cycles_dir, shards_dir)
+    if ARCHIVE_MAX_BYTES is not None:
+        with profiler.stage("prune"):
+            pruned = prune_cycles(ARCHIVE_MAX_BYTES, cycles_dir)
+            prune_shards(pruned, shards_dir)
+        if pruned:
+            print(f"Archive over {ARCHIVE_MAX_BYTES / 2**30:.1f} GiB, removed cycles {pruned[0]}-{pruned[-1]}.")
+    return cycles
+
 
+def new_profile_dir():
+    profile_dir = os.path.join(PROFILE_DIR, time.strftime("%Y%m%d-%H%M%S"))
+    os.makedirs(profile_dir, exist_ok=True)
+    return profile_dir
+
+
+def cycle_once(profile=False, backpressure=None, gain_control=None):
+    profiler = StageProfiler(profile)
+    tx_record, decimation, window = TX_RECORD, 1, 1.0
+    if backpressure is not None:
+        mode = backpressure.mode
+        tx_record, decimation, window = mode.tx_record, mode.decimation, mode.window
+    if RX_CHANNELS:
+        # The channelizer already cuts the rate, and a full-rate TX file can't be
+        # paired with a channel, so TX is regenerated per channel instead.
+        tx_record, decimation = False, 1
+    tx_args = ["--record", "1" if tx_record else "0", "--waveform", TX_WAVEFORM]
+    rx_args = ["--decimation", str(decimation), "--num-samples", str(int(CAPTURE_SAMPLES * window)),
+               "--channels", RX_CHANNELS, "--num-chans", str(RX_NUM_CHANS)]
+    if TRIGGER_ENABLED:
+        rx_args += ["--trigger", "1", "--trigger-threshold", str(TRIGGER_THRESHOLD_DB),
+                    "--trigger-pre", str(TRIGGER_PRE_SECONDS), "--trigger-post", str(TRIGGER_POST_SECONDS)]
+    if gain_control is not None:
+        tx_args += gain_control.tx_args()
+        rx_args += gain_control.rx_args()
+    if PROBE_ENABLED:
+        # Each flowgraph probes its device in-process and reports a failure over
+        # the start barrier, so a wedged HackRF fails the cycle before it runs.
+        tx_args += ["--probe", "1"]
+        rx_args += ["--probe", "1"]
+    env = None
+    if profile:
+        profile_dir = new_profile_dir()
+        tx_args += ["--profile", os.path.join(profile_dir, "tx_blocks.txt")]
+        rx_args += ["--profile", os.path.join(profile_dir, "rx_blocks.txt")]
+        env = dict(os.environ, **PERF_COUNTERS_ENV)
 
-def cycle_once():
     print("Launching TX and RX scripts...")
-    tx_proc = run_flowgraph(TX_SCRIPT)
-    rx_proc = run_flowgraph(RX_SCRIPT)
-    
+    with profiler.stage("launch"):
+        start_time = time.time()
+        if START_BARRIER:
+            barrier = StartBarrier(("tx", "rx"))
+            tx_proc = run_flowgraph(TX_SCRIPT, *tx_args, *barrier.child_args("tx"), env=env,
+                                    pass_fds=barrier.child_fds("tx"))
+            rx_proc = run_flowgraph(RX_SCRIPT, *rx_args, *barrier.child_args("rx"), env=env,
+                                    pass_fds=barrier.child_fds("rx"))
+            barrier.close_child_ends()
+            # Neither side streams until both devices are open, so the capture
+            # holds only samples where TX and RX overlap.
+            if not barrier.wait_ready(BARRIER_TIMEOUT):
+                barrier.close()
+                terminate_process(tx_proc)
+                terminate_process(rx_proc)
+                print("Start barrier failed, skipping cycle.\n")
+                recover_devices()
+                return
+            start_time = barrier.release()
+        else:
+            tx_proc = run_flowgraph(TX_SCRIPT, *tx_args, env=env)
+            rx_proc = run_flowgraph(RX_SCRIPT, *rx_args, env=env)
 
     print(f"Running for {RUNTIME_SECONDS} seconds...")
-    time.sleep(RUNTIME_SECONDS)
+    write_rate = watch_writes([tx_proc, rx_proc], RUNTIME_SECONDS)
 
     print("Terminating scripts...")
-    terminate_process(tx_proc)
-    terminate_process(rx_proc)
+    with profiler.stage("terminate"):
+        terminate_process(tx_proc)
+        terminate_process(rx_proc)
 
-    print("Saving to CSV...")
-    save_to_csv(os.path.join(DATA_DIR, "rxdata.dat"),
-                os.path.join(DATA_DIR, "txdata.dat"),
-                CSV_FILE_PATH)
-    print("Cycle complete.\n")
+    tx_file_path = os.path.join(DATA_DIR, "txdata.dat" if tx_record else TX_PARAMS_FILE)
+    if not capture_is_valid(tx_file_path):
+        print("Capture failed, skipping cycle.\n")
+        recover_devices()
+        return
+    if RX_CHANNELS:
+        captures = channel_captures(tx_file_path)
+    else:
+        if decimation > 1 and is_params_file(tx_file_path):
+            derive_params(tx_file_path, tx_file_path, decimation,
+                          cutoff=DECIMATION_CUTOFF * SAMP_RATE / decimation)
+        captures = [(os.path.join(DATA_DIR, "rxdata.dat"), tx_file_path, SAMP_RATE / decimation)]
+    if not all(capture_is_valid(rx_file_path) for rx_file_path, _, _ in captures):
+        print("Capture failed, skipping cycle.\n")
+        recover_devices()
+        return
+    if backpressure is not None and not RX_CHANNELS:
+        backpressure.observe(write_rate)
+    if gain_control is not None:
+        # Measured before processing, which may move or discard the captures.
+        with profiler.stage("gain"):
+            gain_control.observe(combine_measurements(
+                [measure_capture(rx_file_path) for rx_file_path, _, _ in captures]))
+
+    cycles = []
+    for rx_file_path, tx_file_path, samp_rate in captures:
+        cycles += process_capture(rx_file_path, tx_file_path, start_time, profiler, samp_rate)
+
+    if profile:
+        profiler.dump(os.path.join(profile_dir, "orchestrator.txt"))
+        print(f"Profile written to {profile_dir}")
+    print(f"Cycle complete ({len(cycles)} captures archived).\n")
+
+
+def replay_once(replay_dir, speed=0.0, use_gnuradio=False, profile=False, archive=True):
+    # Drives process_capture from a recording instead of the radios and reports
+    # the throughput of both halves. Without archive the cycle is processed in a
+    # scratch directory that is removed afterwards, so repeated benchmark runs
+    # don't fill the disk.
+    profiler = StageProfiler(profile)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    cycles_dir, shards_dir, csv_file_path = CYCLES_DIR, SHARDS_DIR, CSV_FILE_PATH
+    if not archive:
+        cycles_dir = tempfile.mkdtemp(prefix="replay-", dir=DATA_DIR)
+        shards_dir = os.path.join(cycles_dir, "shards")
+        csv_file_path = os.path.join(cycles_dir, "signal.csv")
 
+    print(f"Replaying {replay_dir} at {f'{speed}x real time' if speed else 'full speed'}...")
+    start_time = time.time()
+    replay_start = time.perf_counter()
+    with profiler.stage("replay"):
+        rx_file_path, tx_file_path, samples, samp_rate = replay(replay_dir, DATA_DIR, speed, use_gnuradio,
+                                                                start_time=start_time)
+    replay_seconds = time.perf_counter() - replay_start
 
-def main():
+    process_start = time.perf_counter()
+    try:
+        cycles = process_capture(rx_file_path, tx_file_path, start_time, profiler, samp_rate,
+                                 cycles_dir=cycles_dir, shards_dir=shards_dir, csv_file_path=csv_file_path)
+        process_seconds = time.perf_counter() - process_start
+    finally:
+        if not archive:
+            shutil.rmtree(cycles_dir, ignore_errors=True)
+
+    print(f"Replayed {samples} samples in {replay_seconds:.2f} s "
+          f"({samples / max(replay_seconds, 1e-9) / 1e6:.2f} MS/s).")
+    print(f"Processed in {process_seconds:.2f} s "
+          f"({samples / max(process_seconds, 1e-9) / 1e6:.2f} MS/s, "
+          f"{samples / samp_rate / max(process_seconds, 1e-9):.1f}x real time).")
+    if profile:
+        profile_dir = new_profile_dir()
+        profiler.dump(os.path.join(profile_dir, "orchestrator.txt"))
+        print(f"Profile written to {profile_dir}")
+    print(f"Replay complete ({len(cycles)} captures {'archived' if archive else 'processed'}).\n")
+
+
+def argument_parser():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Profile each cycle and enable GNU Radio per-block performance counters")
+    parser.add_argument(
+        "--replay", metavar="DIR",
+        help="Process a recording (rxdata.dat plus txdata.dat or txparams.json) instead of running the radios")
+    parser.add_argument(
+        "--replay-speed", type=float, default=0.0,
+        help="Replay rate as a multiple of real time; 0 is unthrottled")
+    parser.add_argument(
+        "--replay-gnuradio", action="store_true",
+        help="Replay through a GNU Radio file_source/throttle/file_sink flowgraph")
+    parser.add_argument(
+        "--replay-cycles", type=int, default=1,
+        help="Number of times to replay the recording")
+    parser.add_argument(
+        "--replay-no-archive", action="store_true",
+        help="Process replays in a scratch directory and discard them instead of archiving to Data/cycles")
+    return parser
+
+
+def main(options=None):
+    if options is None:
+        options = argument_parser().parse_args()
     install_requirements()
 
+    if options.replay:
+        for _ in range(options.replay_cycles):
+            replay_once(options.replay, options.replay_speed, options.replay_gnuradio, options.profile,
+                        archive=not options.replay_no_archive)
+        return
+
+    if TX_WAVEFORM and RX_CHANNELS:
+        raise ValueError("TX_WAVEFORM can't be combined with RX_CHANNELS: the channel references are "
+                         "regenerated, and a wideband waveform can't be reconstructed per channel")
+
+    backpressure = None
+    if DISK_SELFTEST:
+        print(f"Measuring write bandwidth in {DATA_DIR}...")
+        bandwidth = measure_write_bandwidth(DATA_DIR)
+        print(f"Sustained write bandwidth: {bandwidth / 1e6:.0f} MB/s")
+        backpressure = BackpressureController(capture_modes(TX_RECORD, decimate=not TX_WAVEFORM),
+                                              SAMP_RATE, bandwidth)
+        print(f"Capture mode: {backpressure.mode}")
+
+    gain_control = GainController() if GAIN_CONTROL else None
+
     while True:
-        cycle_once()
+        cycle_once(profile=options.profile, backpressure=backpressure, gain_control=gain_control)
         time.sleep(2)  # Optional delay between cycles
 
 
@@ -0,0 +1,147 @@
+import os
+import re
+import sys
+import tempfile
+from argparse import ArgumentParser
+from multiprocessing import Pool
+
+import numpy as np
+
+from capture_store import CYCLES_DIR, SAMP_RATE, store_cycle
+
+CSV_FILE_PATH = os.path.join("Data", "signal.csv")
+CHUNK_BYTES = 64 << 20  # bytes of CSV text parsed per task
+NUM_COLUMNS = 7         # Index, TX Real/Imag/Magnitude, RX Real/Imag/Magnitude
+SKIP_LINES = re.compile(rb"^(?:Index[^\n]*)?\r?\n", re.MULTILINE)  # header and blank lines
+NEWLINE_TO_COMMA = bytes.maketrans(b"\n", b",")
+
+
+def _chunk_ranges(csv_file_path, chunk_bytes):
+    size = os.path.getsize(csv_file_path)
+    return [(csv_file_path, start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)]
+
+
+def _parse_chunk(task):
+    # A chunk owns every line that starts inside [start, end).
+    csv_file_path, start, end = task
+    with open(csv_file_path, "rb") as file:
+        if start:
+            file.seek(start - 1)
+            if file.read(1) != b"\n":
+                file.readline()
+        pos = file.tell()
+        if file.read(5) == b"Index":
+            # Skipped here rather than cut out of data, which would copy the chunk.
+            file.readline()
+        else:
+            file.seek(pos)
+        pos = file.tell()
+        data = file.read(end - pos) if end > pos else b""
+        if data and not data.endswith(b"\n"):
+            data += file.readline()
+
+    # Parsed as one comma-separated run of numbers in C; splitting into Python
+    # strings cost about eight times the chunk size in memory.
+    if data.startswith((b"\n", b"\r\n")) or any(s in data for s in (b"\nIndex", b"\n\n", b"\n\r\n")):
+        data = SKIP_LINES.sub(b"", data)
+    data = data.translate(NEWLINE_TO_COMMA, b"\r")  # a trailing comma is accepted
+    if not data:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.complex64), np.empty(0, dtype=np.complex64)
+    values = np.fromstring(data, dtype=np.float64, sep=",")
+    del data
+    if len(values) % NUM_COLUMNS:
+        raise ValueError(f"{csv_file_path}: malformed rows in bytes {start}-{end}")
+    values = values.reshape(-1, NUM_COLUMNS)
+    index = values[:, 0].astype(np.int64)
+    tx = (values[:, 1] + 1j * values[:, 2]).astype(np.complex64)
+    rx = (values[:, 4] + 1j * values[:, 5]).astype(np.complex64)
+    return index, tx, rx
+
+
+class _CycleWriter:
+    """Appends parsed rows to temporary per-cycle files and archives each finished cycle."""
+
+    def __init__(self, cycles_dir, start_time, samp_rate):
+        self.cycles_dir = cycles_dir
+        self.start_time = start_time
+        self.samp_rate = samp_rate
+        self.tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(cycles_dir)))
+        self.tx_path = os.path.join(self.tmp_dir, "tx.dat")
+        self.rx_path = os.path.join(self.tmp_dir, "rx.dat")
+        self.tx_file = self.rx_file = None
+        self.samples = 0
+        self.cycles = []
+
+    def append(self, tx, rx):
+        if self.tx_file is None:
+            self.tx_file = open(self.tx_path, "wb")
+            self.rx_file = open(self.rx_path, "wb")
+        tx.tofile(self.tx_file)
+        rx.tofile(self.rx_file)
+        self.samples += len(tx)
+
+    def finish_cycle(self):
+        if self.tx_file is None:
+            return
+        self.tx_file.close()
+        self.rx_file.close()
+        self.tx_file = self.rx_file = None
+        # CSV rows carry no timestamps, so cycles are laid end to end from start_time.
+        self.cycles.append(store_cycle(self.tx_path, self.rx_path, self.start_time,
+                                       self.samp_rate, self.cycles_dir))
+        self.start_time += self.samples / self.samp_rate
+        self.samples = 0
+
+    def close(self):
+        self.finish_cycle()
+        os.rmdir(self.tmp_dir)
+
+
+def migrate(csv_file_path=CSV_FILE_PATH, cycles_dir=CYCLES_DIR, start_time=0.0, samp_rate=SAMP_RATE,
+            workers=None, chunk_bytes=CHUNK_BYTES):
+    workers = workers or os.cpu_count() or 1
+    tasks = _chunk_ranges(csv_file_path, chunk_bytes)
+    os.makedirs(cycles_dir, exist_ok=True)
+    writer = _CycleWriter(cycles_dir, start_time, samp_rate)
+
+    with Pool(workers) as pool:
+        # Parse one batch per worker at a time so memory stays bounded by the batch.
+        for batch_start in range(0, len(tasks), workers):
+            for index, tx, rx in pool.map(_parse_chunk, tasks[batch_start:batch_start + workers]):
+                # Every cycle written by save_to_csv restarts its Index column at 0.
+                edges = np.concatenate(([0], np.flatnonzero(index == 0), [len(index)]))
+                for i, (lo, hi) in enumerate(zip(edges[:-1], edges[1:])):
+                    if i:
+                        writer.finish_cycle()
+                    if hi > lo:
+                        writer.append(tx[lo:hi], rx[lo:hi])
+            print(f"Migrated {min(batch_start + workers, len(tasks))}/{len(tasks)} chunks...")
+
+    writer.close()
+    return writer.cycles
+
+
+def argument_parser():
+    parser = ArgumentParser(description="Convert a legacy signal.csv into per-cycle complex64 captures.")
+    parser.add_argument("csv_file", nargs="?", default=CSV_FILE_PATH)
+    parser.add_argument("--cycles-dir", default=CYCLES_DIR)
+    parser.add_argument("--start-time", type=float, default=0.0,
+                        help="Epoch time assigned to the first cycle (CSV rows carry no timestamps)")
+    parser.add_argument("--samp-rate", type=float, default=SAMP_RATE)
+    parser.add_argument("--workers", type=int, default=None)
+    return parser
+
+
+def main(options=None):
+    if options is None:
+        options = argument_parser().parse_args()
+    if not os.path.exists(options.csv_file):
+        print(f"No such file: {options.csv_file}")
+        sys.exit(1)
+    cycles = migrate(options.csv_file, options.cycles_dir, options.start_time, options.samp_rate,
+                     options.workers)
+    print(f"Migrated {len(cycles)} cycles into {options.cycles_dir}")
+
+
+if __name__ == "__main__":
+    main()
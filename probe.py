@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# Quick health check of one HackRF before a cycle: opens the device, streams a
+# few thousand samples and, on the RX side, checks the signal level. RX.py and
+# TX.py run it in-process through run_probe; this script runs it standalone.
+#
+
+import os
+import sys
+import threading
+from argparse import ArgumentParser
+
+import numpy as np
+from gnuradio import blocks
+from gnuradio import gr
+from gnuradio import soapy
+
+from start_barrier import report_failure
+
+RX_SERIAL = 'Serial=2a8a8313'
+TX_SERIAL = 'Serial=2a7f8313'
+PROBE_SAMPLES = 8192
+OPEN_TIMEOUT = 3.0        # seconds allowed for the device to open
+STREAM_TIMEOUT = 0.5     # seconds allowed for PROBE_SAMPLES to flow once started
+MIN_POWER_DB = -100.0    # an RX below this is returning zeros, not noise
+MAX_CLIP_FRACTION = 0.5  # an RX above this is wedged at full scale
+
+EXIT_OK = 0
+EXIT_OPEN_FAILED = 2
+EXIT_STREAM_FAILED = 3
+EXIT_BAD_LEVEL = 4
+
+
+class Probe(gr.top_block):
+
+    def __init__(self, side='rx', num_samples=PROBE_SAMPLES):
+        gr.top_block.__init__(self, "Probe", catch_exceptions=True)
+
+        self.samp_rate = samp_rate = 10000000
+        self.center_freq = center_freq = 2400000000
+
+        self.blocks_head_0 = blocks.head(gr.sizeof_gr_complex*1, num_samples)
+        if side == 'rx':
+            self.soapy_hackrf_source_0 = soapy.source('driver=hackrf', "fc32", 1, RX_SERIAL, '', [''], [''])
+            self.soapy_hackrf_source_0.set_sample_rate(0, samp_rate)
+            self.soapy_hackrf_source_0.set_frequency(0, center_freq)
+            self.blocks_vector_sink_0 = blocks.vector_sink_c(1, num_samples)
+            self.connect((self.soapy_hackrf_source_0, 0), (self.blocks_head_0, 0))
+            self.connect((self.blocks_head_0, 0), (self.blocks_vector_sink_0, 0))
+        else:
+            self.soapy_hackrf_sink_0 = soapy.sink('driver=hackrf', "fc32", 1, TX_SERIAL, '', [''], [''])
+            self.soapy_hackrf_sink_0.set_sample_rate(0, samp_rate)
+            self.soapy_hackrf_sink_0.set_frequency(0, center_freq)
+            self.blocks_null_source_0 = blocks.null_source(gr.sizeof_gr_complex*1)
+            self.connect((self.blocks_null_source_0, 0), (self.blocks_head_0, 0))
+            self.connect((self.blocks_head_0, 0), (self.soapy_hackrf_sink_0, 0))
+
+
+def check_level(samples):
+    if not len(samples):
+        return "no samples"
+    power = np.mean(samples.real * samples.real + samples.imag * samples.imag)
+    power_db = 10 * np.log10(max(power, 1e-20))
+    clip_fraction = np.mean((np.abs(samples.real) >= 0.99) | (np.abs(samples.imag) >= 0.99))
+    if power_db < MIN_POWER_DB:
+        return f"signal level {power_db:.1f} dBFS below {MIN_POWER_DB} dBFS"
+    if clip_fraction > MAX_CLIP_FRACTION:
+        return f"{clip_fraction:.0%} of samples clipped"
+    return None
+
+
+def _with_timeout(target, timeout):
+    # Runs target in a daemon thread; (finished, result, exception).
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = target()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive(), outcome.get("result"), outcome.get("error")
+
+
+def run_probe(side, num_samples=PROBE_SAMPLES):
+    # Returns (exit_code, message). After EXIT_OPEN_FAILED or EXIT_STREAM_FAILED
+    # the device may be wedged and a teardown can block, so the caller should
+    # leave with os._exit rather than go on to open it again.
+    finished, tb, error = _with_timeout(lambda: Probe(side, num_samples), OPEN_TIMEOUT)
+    if not finished:
+        return EXIT_OPEN_FAILED, f"device open did not finish in {OPEN_TIMEOUT} s"
+    if error is not None:
+        return EXIT_OPEN_FAILED, f"device open failed: {error}"
+
+    tb.start()
+    finished, _, _ = _with_timeout(tb.wait, STREAM_TIMEOUT)
+    if not finished:
+        return EXIT_STREAM_FAILED, f"stream did not deliver {num_samples} samples in {STREAM_TIMEOUT} s"
+
+    problem = None
+    if side == 'rx':
+        problem = check_level(np.array(tb.blocks_vector_sink_0.data(), dtype=np.complex64))
+    # Releases the device for the flowgraph that opens it next.
+    tb.stop()
+    tb.wait()
+    tb.disconnect_all()
+    del tb
+    if problem:
+        return EXIT_BAD_LEVEL, problem
+    return EXIT_OK, "ok"
+
+
+def probe_or_exit(side, barrier_spec=''):
+    # Called by RX.py and TX.py before they open the device for the cycle; a
+    # failure goes to the orchestrator over the start barrier pipe.
+    code, message = run_probe(side)
+    if code == EXIT_OK:
+        return
+    print(f"probe {side}: {message}")
+    report_failure(barrier_spec, f"probe {message}")
+    sys.stdout.flush()
+    os._exit(code)
+
+
+def argument_parser():
+    parser = ArgumentParser()
+    parser.add_argument("--side", choices=("rx", "tx"), default="rx")
+    parser.add_argument("--samples", type=int, default=PROBE_SAMPLES)
+    return parser
+
+
+def main(options=None):
+    if options is None:
+        options = argument_parser().parse_args()
+
+    code, message = run_probe(options.side, options.samples)
+    print(f"probe {options.side}: {message}")
+    sys.stdout.flush()
+    # A wedged device can block interpreter teardown, so leave without it.
+    os._exit(code)
+
+
+if __name__ == '__main__':
+    main()
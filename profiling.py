@@ -0,0 +1,64 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+from contextlib import contextmanager
+
+PROFILE_DIR = os.path.join("Data", "profiles")
+TOP_FUNCTIONS = 25  # rows of the cProfile table kept per report
+# GNU Radio reads this when the flowgraph process starts; per-block counters stay at 0 without it.
+PERF_COUNTERS_ENV = {"GR_CONF_PERFCOUNTERS_ON": "True"}
+
+
+class StageProfiler:
+    """Wall time per cycle stage plus one cProfile table; a no-op when disabled."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stage_times = {}
+        self._profile = cProfile.Profile() if enabled else None
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        self._profile.enable()
+        try:
+            yield
+        finally:
+            self._profile.disable()
+            self.stage_times[name] = self.stage_times.get(name, 0.0) + time.perf_counter() - start
+
+    def dump(self, path):
+        if not self.enabled:
+            return
+        stream = io.StringIO()
+        stream.write("Stage wall times (s)\n")
+        for name, seconds in self.stage_times.items():
+            stream.write(f"  {name:<12} {seconds:10.3f}\n")
+        stream.write("\n")
+        pstats.Stats(self._profile, stream=stream).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        with open(path, "w") as file:
+            file.write(stream.getvalue())
+
+
+def flowgraph_blocks(tb):
+    # Every block attribute of a generated top_block exposes the pc_* counters.
+    return sorted(((name, blk) for name, blk in vars(tb).items() if hasattr(blk, "pc_work_time_total")),
+                  key=lambda item: item[0])
+
+
+def write_block_report(path, tb):
+    with open(path, "w") as file:
+        file.write(f"{'block':<32} {'work total (ticks)':>20} {'work avg':>12} {'throughput':>14} "
+                   f"{'in full':>8} {'out full':>8}\n")
+        for name, blk in flowgraph_blocks(tb):
+            in_full = blk.pc_input_buffers_full_avg()
+            out_full = blk.pc_output_buffers_full_avg()
+            file.write(f"{name:<32} {blk.pc_work_time_total():>20.0f} {blk.pc_work_time_avg():>12.1f} "
+                       f"{blk.pc_throughput_avg():>14.1f} "
+                       f"{(in_full[0] if len(in_full) else 0.0):>8.2f} "
+                       f"{(out_full[0] if len(out_full) else 0.0):>8.2f}\n")
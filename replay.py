@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from capture_store import SAMP_RATE, CaptureReader
+from sigmf_meta import meta_path, read_meta, restamp_meta, start_time as meta_start_time
+from tx_reference import TX_PARAMS_FILE, is_params_file, load_params
+
+REPLAY_CHUNK = 1 << 20  # samples copied per pacing step
+
+
+def _first_existing(replay_dir, names):
+    # Empty files are skipped: a flowgraph that never streamed leaves its
+    # truncated output behind.
+    for name in names:
+        path = os.path.join(replay_dir, name)
+        if os.path.exists(path) and os.path.getsize(path):
+            return path
+    raise FileNotFoundError(f"Replay recording {replay_dir} has none of {', '.join(names)}")
+
+
+def find_recording(replay_dir):
+    # Accepts both a Data/-style recording and an archived cycle directory. TX
+    # parameters win over a TX data file: they are only written when TX wasn't
+    # recorded, so a data file next to them is a leftover.
+    rx_path = _first_existing(replay_dir, ("rxdata.dat", "rx.dat"))
+    tx_path = _first_existing(replay_dir, (TX_PARAMS_FILE, "tx_params.json", "txdata.dat", "tx.dat"))
+    return rx_path, tx_path
+
+
+def recording_rate(rx_path, tx_path, default=SAMP_RATE):
+    # Decimated and channelized recordings run below SAMP_RATE. The RX sidecar
+    # is authoritative; regenerated TX parameters and, for an archived cycle,
+    # the archive index are the fallbacks for recordings without one.
+    if os.path.exists(meta_path(rx_path)):
+        return float(read_meta(meta_path(rx_path))["global"]["core:sample_rate"])
+    if is_params_file(tx_path):
+        return float(load_params(tx_path)["samp_rate"])
+    cycle_dir = os.path.dirname(os.path.abspath(rx_path))
+    cycles_dir = os.path.dirname(cycle_dir)
+    for row in CaptureReader(cycles_dir).cycles():
+        if os.path.abspath(os.path.join(cycles_dir, row["rx_file"])) == os.path.abspath(rx_path):
+            return row["samp_rate"]
+    return default
+
+
+def _check_distinct(src, dst):
+    # Opening dst for writing would truncate a recording that is already there.
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise ValueError(f"Replay source {src} is the replay destination; "
+                         f"move the recording out of {os.path.dirname(dst) or '.'} first")
+
+
+def _copy_paced(src, dst, speed, samp_rate):
+    start = time.perf_counter()
+    copied = 0
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        while True:
+            data = np.fromfile(src_file, dtype=np.complex64, count=REPLAY_CHUNK)
+            if not len(data):
+                break
+            data.tofile(dst_file)
+            copied += len(data)
+            if speed:
+                ahead = copied / (samp_rate * speed) - (time.perf_counter() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+    return copied
+
+
+def _copy_sidecars(pairs, start_time):
+    # Data sidecars are re-dated to the replay, keeping TX and RX at their
+    # recorded offset from each other. A replayed cycle under the original
+    # timestamps would make time-range reads return the same samples twice.
+    shift = None
+    for src, dst in pairs:
+        if is_params_file(src):
+            shutil.copyfile(src, dst)
+        elif os.path.exists(meta_path(src)):
+            meta = read_meta(meta_path(src))
+            if shift is None:
+                shift = start_time - meta_start_time(meta)
+            with open(meta_path(dst), "w") as file:
+                json.dump(restamp_meta(meta, meta_start_time(meta) + shift), file, indent=1)
+
+
+def replay(replay_dir, data_dir, speed=0.0, use_gnuradio=False, samp_rate=None, start_time=None):
+    # Recreates Data/rxdata.dat and Data/txdata.dat (or txparams.json) from a
+    # recording, as if the flowgraphs had just run at start_time (now by default). speed is a multiple of real
+    # time at the recording's own rate (read from it unless samp_rate is given);
+    # 0 copies as fast as the disk allows. Returns (rx, tx) destinations, the
+    # number of RX samples replayed and the sample rate.
+    rx_src, tx_src = find_recording(replay_dir)
+    if samp_rate is None:
+        samp_rate = recording_rate(rx_src, tx_src)
+    rx_dst = os.path.join(data_dir, "rxdata.dat")
+    tx_is_params = is_params_file(tx_src)
+    tx_dst = os.path.join(data_dir, TX_PARAMS_FILE if tx_is_params else "txdata.dat")
+    _check_distinct(rx_src, rx_dst)
+    _check_distinct(tx_src, tx_dst)
+
+    if use_gnuradio:
+        from replay_flowgraph import Replay
+        tb = Replay(rx_src, rx_dst, None if tx_is_params else tx_src, None if tx_is_params else tx_dst,
+                    samp_rate, speed)
+        tb.run()
+        samples = os.path.getsize(rx_dst) // np.dtype(np.complex64).itemsize
+    else:
+        # Both streams are paced side by side, as the two flowgraphs would write them.
+        if not tx_is_params:
+            tx_thread = threading.Thread(target=_copy_paced, args=(tx_src, tx_dst, speed, samp_rate))
+            tx_thread.start()
+        samples = _copy_paced(rx_src, rx_dst, speed, samp_rate)
+        if not tx_is_params:
+            tx_thread.join()
+
+    _copy_sidecars(((rx_src, rx_dst), (tx_src, tx_dst)), time.time() if start_time is None else start_time)
+    return rx_dst, tx_dst, samples, samp_rate
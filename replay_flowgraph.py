@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+#
+# GNU Radio Python Flow Graph
+# Title: Replay
+# Plays recorded rxdata/txdata files back through file_source -> file_sink,
+# optionally throttled, in place of the RX/TX hardware flowgraphs.
+#
+
+from gnuradio import blocks
+from gnuradio import gr
+
+
+class Replay(gr.top_block):
+
+    def __init__(self, rx_source, rx_sink, tx_source=None, tx_sink=None, samp_rate=10000000, speed=1.0):
+        gr.top_block.__init__(self, "Replay", catch_exceptions=True)
+
+        ##################################################
+        # Variables
+        ##################################################
+        self.samp_rate = samp_rate
+        self.speed = speed
+
+        ##################################################
+        # Blocks
+        ##################################################
+        self.blocks_file_source_rx = blocks.file_source(gr.sizeof_gr_complex*1, rx_source, False, 0, 0)
+        self.blocks_file_sink_rx = blocks.file_sink(gr.sizeof_gr_complex*1, rx_sink, False)
+        self._connect_stream(self.blocks_file_source_rx, self.blocks_file_sink_rx, 'rx')
+
+        if tx_source is not None:
+            self.blocks_file_source_tx = blocks.file_source(gr.sizeof_gr_complex*1, tx_source, False, 0, 0)
+            self.blocks_file_sink_tx = blocks.file_sink(gr.sizeof_gr_complex*1, tx_sink, False)
+            self._connect_stream(self.blocks_file_source_tx, self.blocks_file_sink_tx, 'tx')
+
+    def _connect_stream(self, source, sink, name):
+        if self.speed:
+            throttle = blocks.throttle(gr.sizeof_gr_complex*1, self.samp_rate * self.speed, True)
+            setattr(self, f'blocks_throttle_{name}', throttle)
+            self.connect((source, 0), (throttle, 0))
+            self.connect((throttle, 0), (sink, 0))
+        else:
+            self.connect((source, 0), (sink, 0))
@@ -0,0 +1,149 @@
+import json
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from capture_store import CYCLES_DIR, CaptureReader
+
+SHARDS_DIR = os.path.join("Data", "shards")
+MANIFEST_FILE = "manifest.json"
+WINDOW = 1024           # samples per window
+SHARD_WINDOWS = 4096    # windows per .npy shard (64 MB of float32)
+CHANNELS = ("tx_real", "tx_imag", "rx_real", "rx_imag")
+
+
+def _read_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {"window": WINDOW, "channels": list(CHANNELS), "shards": []}
+    with open(manifest_path) as file:
+        return json.load(file)
+
+
+def _write_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+
+def to_windows(tx, rx, window=WINDOW):
+    # (num_windows, 4, window) float32 with channels ordered as in CHANNELS.
+    n = min(len(tx), len(rx)) // window * window
+    out = np.empty((n // window, len(CHANNELS), window), dtype=np.float32)
+    out[:, 0] = tx[:n].real.reshape(-1, window)
+    out[:, 1] = tx[:n].imag.reshape(-1, window)
+    out[:, 2] = rx[:n].real.reshape(-1, window)
+    out[:, 3] = rx[:n].imag.reshape(-1, window)
+    return out
+
+
+def _remove_files(shards_dir, names):
+    for name in names:
+        path = os.path.join(shards_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def export_shards(cycle, cycles_dir=CYCLES_DIR, shards_dir=SHARDS_DIR, window=WINDOW,
+                  shard_windows=SHARD_WINDOWS):
+    # Replaces any shards already listed for the cycle number, so re-exporting a
+    # cycle, or a cycle number reused after the index was reset, never leaves
+    # duplicate rows. Names carry the cycle start time to keep captures apart.
+    os.makedirs(shards_dir, exist_ok=True)
+    manifest_path = os.path.join(shards_dir, MANIFEST_FILE)
+    manifest = _read_manifest(manifest_path)
+    if manifest["window"] != window:
+        raise ValueError(f"{manifest_path} holds {manifest['window']}-sample windows, not {window}")
+
+    reader = CaptureReader(cycles_dir, chunk_samples=window * shard_windows)
+    info = reader.cycle_info(cycle)
+    stamp = int(round(info["start_time"] * 1e6))
+    stale = [shard for shard in manifest["shards"] if shard["cycle"] == cycle]
+    manifest["shards"] = [shard for shard in manifest["shards"] if shard["cycle"] != cycle]
+    names = set()
+    for part, (offset, tx, rx) in enumerate(reader.iter_chunks(cycle)):
+        windows = to_windows(tx, rx, window)
+        if not len(windows):
+            continue
+        name = f"cycle_{cycle:06d}_{stamp}_{part:04d}.npy"
+        np.save(os.path.join(shards_dir, name), windows)
+        names.add(name)
+        manifest["shards"].append({
+            "file": name,
+            "cycle": cycle,
+            "start_time": info["start_time"],
+            "start_sample": offset,
+            "num_windows": len(windows),
+        })
+    _write_manifest(manifest_path, manifest)
+    _remove_files(shards_dir, [shard["file"] for shard in stale if shard["file"] not in names])
+
+
+def prune_shards(cycles, shards_dir=SHARDS_DIR):
+    # Drops the shards of cycles removed from the archive, manifest first so a
+    # crash part-way leaves orphan files rather than rows pointing at missing ones.
+    manifest_path = os.path.join(shards_dir, MANIFEST_FILE)
+    if not cycles or not os.path.exists(manifest_path):
+        return []
+    cycles = set(cycles)
+    manifest = _read_manifest(manifest_path)
+    removed = [shard for shard in manifest["shards"] if shard["cycle"] in cycles]
+    if not removed:
+        return []
+    manifest["shards"] = [shard for shard in manifest["shards"] if shard["cycle"] not in cycles]
+    _write_manifest(manifest_path, manifest)
+    _remove_files(shards_dir, [shard["file"] for shard in removed])
+    return [shard["file"] for shard in removed]
+
+
+class ShardLoader:
+    """Iterates float32 batches of windows from memory-mapped shards, prefetched by background threads."""
+
+    def __init__(self, shards_dir=SHARDS_DIR, batch_size=64, cycles=None, shuffle=False, prefetch=4,
+                 workers=2, seed=None):
+        self.shards_dir = shards_dir
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.prefetch = prefetch
+        self.workers = workers
+        self._rng = np.random.default_rng(seed)
+
+        manifest = _read_manifest(os.path.join(shards_dir, MANIFEST_FILE))
+        self.window = manifest["window"]
+        self.shards = [shard for shard in manifest["shards"] if cycles is None or shard["cycle"] in cycles]
+        self._starts = np.cumsum([0] + [shard["num_windows"] for shard in self.shards])
+        self._arrays = {}
+
+    def __len__(self):
+        return -(-int(self._starts[-1]) // self.batch_size)
+
+    def _array(self, shard):
+        if shard not in self._arrays:
+            path = os.path.join(self.shards_dir, self.shards[shard]["file"])
+            self._arrays[shard] = np.load(path, mmap_mode='r')
+        return self._arrays[shard]
+
+    def _load(self, indices):
+        # Gathers one batch; indices are sorted so each shard is read front to back.
+        indices = np.sort(indices)
+        shards = np.searchsorted(self._starts, indices, side='right') - 1
+        batch = np.empty((len(indices), len(CHANNELS), self.window), dtype=np.float32)
+        for shard in np.unique(shards):
+            mask = shards == shard
+            batch[mask] = self._array(shard)[indices[mask] - self._starts[shard]]
+        return batch
+
+    def __iter__(self):
+        order = np.arange(self._starts[-1])
+        if self.shuffle:
+            self._rng.shuffle(order)
+        with ThreadPoolExecutor(self.workers) as pool:
+            pending = deque()
+            for lo in range(0, len(order), self.batch_size):
+                pending.append(pool.submit(self._load, order[lo:lo + self.batch_size]))
+                if len(pending) >= self.prefetch:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
@@ -0,0 +1,81 @@
+import datetime
+import json
+import os
+
+SIGMF_VERSION = "1.0.0"
+META_EXT = ".sigmf-meta"
+
+
+def meta_path(data_path):
+    return os.path.splitext(data_path)[0] + META_EXT
+
+
+def _isoformat(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def write_meta(path, samp_rate, center_freq, start_time, gains=None, hw="", tags=(), description=""):
+    # SigMF-style sidecar; "astra:" keys carry what the core namespace has no field for.
+    annotations = [{
+        "core:sample_start": tag["offset"],
+        "core:sample_count": 0,
+        "core:label": tag["key"],
+        "astra:value": tag["value"],
+    } for tag in tags]
+    meta = {
+        "global": {
+            "core:datatype": "cf32_le",
+            "core:sample_rate": samp_rate,
+            "core:version": SIGMF_VERSION,
+            "core:hw": hw,
+            "core:description": description,
+            "astra:gains": gains or {},
+        },
+        "captures": [{
+            "core:sample_start": 0,
+            "core:frequency": center_freq,
+            "core:datetime": _isoformat(start_time),
+            "astra:start_time": start_time,
+        }],
+        "annotations": annotations,
+    }
+    with open(path, "w") as file:
+        json.dump(meta, file, indent=1)
+
+
+def read_meta(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def start_time(meta):
+    return meta["captures"][0]["astra:start_time"]
+
+
+def sample_at(meta, timestamp):
+    # O(1) mapping from wall-clock time to a sample offset in the data file.
+    return int(round((timestamp - start_time(meta)) * meta["global"]["core:sample_rate"]))
+
+
+def restamp_meta(meta, start_time):
+    # The same capture, re-dated to start at start_time.
+    restamped = json.loads(json.dumps(meta))
+    capture = restamped["captures"][0]
+    capture["astra:start_time"] = start_time
+    capture["core:datetime"] = _isoformat(start_time)
+    return restamped
+
+
+def slice_meta(meta, start, stop):
+    # Metadata for samples [start, stop) of the original capture.
+    sliced = json.loads(json.dumps(meta))
+    capture = sliced["captures"][0]
+    capture["astra:start_time"] = start_time(meta) + start / meta["global"]["core:sample_rate"]
+    capture["core:datetime"] = _isoformat(capture["astra:start_time"])
+    sliced["annotations"] = []
+    for annotation in meta["annotations"]:
+        if start <= annotation["core:sample_start"] < stop:
+            annotation = dict(annotation)
+            annotation["core:sample_start"] -= start
+            sliced["annotations"].append(annotation)
+    return sliced
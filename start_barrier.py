@@ -0,0 +1,98 @@
+import os
+import select
+import sys
+import time
+
+READY = b"R"
+GO = b"G"
+FAILED = b"F"   # followed by the reason, up to MAX_REASON bytes
+MAX_REASON = 512
+
+
+def wait_for_start(spec):
+    # Flowgraph side: called once the device is open. spec is "go_fd,ready_fd" as
+    # handed out by StartBarrier; an empty spec starts immediately.
+    if not spec:
+        return
+    go_fd, ready_fd = (int(fd) for fd in spec.split(","))
+    os.write(ready_fd, READY)
+    os.close(ready_fd)
+    go = os.read(go_fd, 1)
+    os.close(go_fd)
+    if go != GO:
+        # The orchestrator closed the pipe without releasing us.
+        sys.exit(1)
+
+
+def report_failure(spec, reason):
+    # Flowgraph side: tells the orchestrator the device failed before the
+    # barrier, so it can skip the cycle without waiting for the timeout.
+    if not spec:
+        return
+    go_fd, ready_fd = (int(fd) for fd in spec.split(","))
+    os.write(ready_fd, FAILED + reason.encode()[:MAX_REASON])
+    os.close(ready_fd)
+    os.close(go_fd)
+
+
+class StartBarrier:
+    """Orchestrator side: holds each flowgraph after device open and releases them together."""
+
+    def __init__(self, names):
+        self._closed = False
+        self._pipes = {}
+        for name in names:
+            go_r, go_w = os.pipe()
+            ready_r, ready_w = os.pipe()
+            self._pipes[name] = (go_r, go_w, ready_r, ready_w)
+
+    def child_args(self, name):
+        go_r, _, _, ready_w = self._pipes[name]
+        return ["--barrier", f"{go_r},{ready_w}"]
+
+    def child_fds(self, name):
+        go_r, _, _, ready_w = self._pipes[name]
+        return (go_r, ready_w)
+
+    def close_child_ends(self):
+        for go_r, _, _, ready_w in self._pipes.values():
+            os.close(go_r)
+            os.close(ready_w)
+
+    def wait_ready(self, timeout):
+        pending = {pipes[2]: name for name, pipes in self._pipes.items()}
+        deadline = time.monotonic() + timeout
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Start barrier timed out waiting for {', '.join(pending.values())}.")
+                return False
+            readable, _, _ = select.select(list(pending), [], [], remaining)
+            for fd in readable:
+                status = os.read(fd, 1)
+                if status == FAILED:
+                    reason = os.read(fd, MAX_REASON).decode(errors="replace")
+                    print(f"{pending[fd]} failed before the start barrier: {reason}")
+                    return False
+                if status != READY:
+                    print(f"{pending[fd]} exited before reaching the start barrier.")
+                    return False
+                del pending[fd]
+        return True
+
+    def release(self):
+        # Writes back to back so both flowgraphs start within microseconds.
+        for _, go_w, _, _ in self._pipes.values():
+            os.write(go_w, GO)
+        release_time = time.time()
+        self.close()
+        return release_time
+
+    def close(self):
+        # Closing the go pipes without writing makes any waiting flowgraph exit.
+        if self._closed:
+            return
+        self._closed = True
+        for _, go_w, ready_r, _ in self._pipes.values():
+            os.close(go_w)
+            os.close(ready_r)
@@ -0,0 +1,139 @@
+import os
+
+import numpy as np
+
+from capture_store import CYCLES_DIR, CaptureReader, time_to_sample
+from tx_reference import is_constant_envelope, is_params_file, load_params
+
+BASE_BLOCK = 1000                               # samples per block at the finest level
+LEVEL_FACTOR = 10                               # decimation between consecutive levels
+NUM_LEVELS = 4                                  # 1k, 10k, 100k and 1M samples per block
+BLOCK_SIZES = tuple(BASE_BLOCK * LEVEL_FACTOR ** i for i in range(NUM_LEVELS))
+STREAMS = ("tx", "rx")
+FIELDS = ("min", "max", "mean", "power")       # column order of the stored arrays
+MAX_POINTS = 4000                               # default upper bound on plotted points
+
+
+def summary_path(cycles_dir, cycle, stream, block_size):
+    return os.path.join(cycles_dir, f"cycle_{cycle:06d}", f"summary_{stream}_{block_size}.npy")
+
+
+def _block_stats(x, block_size):
+    # Returns (min, max, sum of magnitude, sum of power, count) per block.
+    mag = np.abs(x)
+    power = mag * mag
+    full = len(x) // block_size * block_size
+    stats = []
+    if full:
+        m = mag[:full].reshape(-1, block_size)
+        p = power[:full].reshape(-1, block_size)
+        stats.append(np.column_stack((m.min(axis=1), m.max(axis=1), m.sum(axis=1, dtype=np.float64),
+                                      p.sum(axis=1, dtype=np.float64), np.full(len(m), block_size))))
+    if full < len(x):
+        m, p = mag[full:], power[full:]
+        stats.append(np.array([[m.min(), m.max(), m.sum(dtype=np.float64),
+                                p.sum(dtype=np.float64), len(m)]]))
+    return np.concatenate(stats) if stats else np.empty((0, 5))
+
+
+def _constant_stats(level, num_samples, block_size):
+    # _block_stats of num_samples samples that all have magnitude level.
+    counts = np.full(num_samples // block_size, block_size, dtype=np.float64)
+    if num_samples % block_size:
+        counts = np.append(counts, num_samples % block_size)
+    return np.column_stack((np.full(len(counts), level), np.full(len(counts), level),
+                            counts * level, counts * level * level, counts))
+
+
+def _coarsen(stats, factor):
+    pad = -len(stats) % factor
+    if pad:
+        filler = np.tile([np.inf, -np.inf, 0.0, 0.0, 0.0], (pad, 1))
+        stats = np.concatenate((stats, filler))
+    grouped = stats.reshape(-1, factor, 5)
+    return np.column_stack((grouped[:, :, 0].min(axis=1), grouped[:, :, 1].max(axis=1),
+                            grouped[:, :, 2].sum(axis=1), grouped[:, :, 3].sum(axis=1),
+                            grouped[:, :, 4].sum(axis=1)))
+
+
+def _finalize(stats):
+    count = stats[:, 4]
+    return np.column_stack((stats[:, 0], stats[:, 1], stats[:, 2] / count,
+                            stats[:, 3] / count)).astype(np.float32)
+
+
+def build_summary(cycle, cycles_dir=CYCLES_DIR):
+    # Single streaming pass over the capture; the chunk size is a multiple of the
+    # base block so only the final chunk can end in a partial block.
+    reader = CaptureReader(cycles_dir, chunk_samples=BASE_BLOCK * 1024)
+    info = reader.cycle_info(cycle)
+    tx_path = reader.path(info, "tx")
+    # A regenerated plain tone has a known flat envelope; its blocks are written
+    # directly rather than synthesizing the whole reference just to measure it.
+    tx_level = None
+    if is_params_file(tx_path):
+        params = load_params(tx_path)
+        if is_constant_envelope(params):
+            tx_level = abs(params["amplitude"])
+
+    base = {stream: [] for stream in STREAMS}
+    for _, tx, rx in reader.iter_chunks(cycle, with_tx=tx_level is None):
+        if tx_level is None:
+            base["tx"].append(_block_stats(tx, BASE_BLOCK))
+        base["rx"].append(_block_stats(rx, BASE_BLOCK))
+    if tx_level is not None:
+        base["tx"].append(_constant_stats(tx_level, info["num_samples"], BASE_BLOCK))
+
+    for stream in STREAMS:
+        stats = np.concatenate(base[stream]) if base[stream] else np.empty((0, 5))
+        for level, block_size in enumerate(BLOCK_SIZES):
+            if level:
+                stats = _coarsen(stats, LEVEL_FACTOR)
+            np.save(summary_path(cycles_dir, cycle, stream, block_size), _finalize(stats))
+
+
+def load_summary(cycle, stream, block_size, cycles_dir=CYCLES_DIR):
+    return np.load(summary_path(cycles_dir, cycle, stream, block_size), mmap_mode='r')
+
+
+def pick_block_size(num_samples, max_points=MAX_POINTS):
+    # Finest level that still fits in max_points; None means raw samples fit.
+    if num_samples <= max_points:
+        return None
+    for block_size in BLOCK_SIZES:
+        if num_samples / block_size <= max_points:
+            return block_size
+    return BLOCK_SIZES[-1]
+
+
+def plot_range(cycle, t_start=0.0, t_stop=None, stream="rx", max_points=MAX_POINTS,
+               cycles_dir=CYCLES_DIR, ax=None):
+    import matplotlib.pyplot as plt
+
+    reader = CaptureReader(cycles_dir)
+    info = reader.cycle_info(cycle)
+    rate = info["samp_rate"]
+    start = max(0, time_to_sample(t_start, 0.0, rate))
+    stop = info["num_samples"] if t_stop is None else min(info["num_samples"], time_to_sample(t_stop, 0.0, rate))
+
+    if ax is None:
+        _, ax = plt.subplots()
+
+    block_size = pick_block_size(stop - start, max_points)
+    if block_size is None:
+        tx, rx = reader.read(cycle, start, stop)
+        mag = np.abs(tx if stream == "tx" else rx)
+        ax.plot((start + np.arange(len(mag))) / rate, mag, linewidth=0.8)
+    else:
+        summary = load_summary(cycle, stream, block_size, cycles_dir)
+        first, last = start // block_size, -(-stop // block_size)
+        blocks = np.asarray(summary[first:last])
+        t = (np.arange(first, first + len(blocks)) * block_size + block_size / 2) / rate
+        ax.fill_between(t, blocks[:, 0], blocks[:, 1], alpha=0.3, label="min/max")
+        ax.plot(t, blocks[:, 2], linewidth=0.8, label="mean")
+        ax.legend()
+
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel(f"{stream.upper()} Magnitude")
+    ax.set_title(f"Cycle {cycle}")
+    return ax
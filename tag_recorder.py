@@ -0,0 +1,34 @@
+import json
+
+import numpy as np
+import pmt
+from gnuradio import gr
+
+
+def _to_json(value):
+    value = pmt.to_python(value)
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    try:
+        json.dumps(value)
+        return value
+    except TypeError:
+        return str(value)
+
+
+class tag_recorder(gr.sync_block):
+    """Sink that keeps every stream tag (rx_time, rx_freq, overflows, ...) with its absolute offset."""
+
+    def __init__(self, dtype=np.complex64):
+        gr.sync_block.__init__(self, name="Tag Recorder", in_sig=[dtype], out_sig=None)
+        self.tags = []
+
+    def work(self, input_items, output_items):
+        start = self.nitems_read(0)
+        for tag in self.get_tags_in_range(0, start, start + len(input_items[0])):
+            self.tags.append({
+                "offset": tag.offset,
+                "key": pmt.symbol_to_string(tag.key),
+                "value": _to_json(tag.value),
+            })
+        return len(input_items[0])
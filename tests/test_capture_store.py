@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from capture_store import CaptureReader, store_cycle, time_to_sample
+from tx_reference import write_params
+
+
+@pytest.mark.parametrize("origin", [0.0, 1000.3, 1760000.123])
+def test_time_to_sample_lands_on_the_nearest_sample(origin):
+    rate = 10e6
+    assert time_to_sample(origin + 0.001, origin, rate) == 10000
+    assert time_to_sample(origin + 0.0123, origin, rate) == 123000
+    assert time_to_sample(origin, origin, rate) == 0
+
+
+def test_time_to_sample_at_epoch_resolution():
+    # An epoch float only resolves ~0.24 us, so the best any rule can do is one sample.
+    origin = 1760000000.123
+    assert abs(time_to_sample(origin + 0.001, origin, 10e6) - 10000) <= 1
+
+
+def test_iter_time_range_starts_on_the_requested_sample(tmp_path):
+    rx_path = str(tmp_path / "rxdata.dat")
+    params_path = str(tmp_path / "txparams.json")
+    cycles_dir = str(tmp_path / "cycles")
+    np.arange(50000, dtype=np.complex64).tofile(rx_path)
+    write_params(params_path, 10e6, 1e5, 1)
+    start_time = 1760000.123
+    store_cycle(params_path, rx_path, start_time, 10e6, cycles_dir)
+
+    chunks = list(CaptureReader(cycles_dir).iter_time_range(start_time + 0.001, start_time + 0.002))
+    rx = np.concatenate([rx for _, _, _, rx in chunks])
+    assert chunks[0][1] == 10000
+    assert np.array_equal(rx.real, np.arange(10000, 20000))
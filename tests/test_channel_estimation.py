@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from channel_estimation import EST_BLOCK, estimate_blocks
+
+SAMP_RATE = 10e6
+
+
+def _pair(cfo_hz, gain=0.3, phase=0.7, snr_db=30.0, blocks=32, seed=0):
+    n = EST_BLOCK * blocks
+    t = np.arange(n) / SAMP_RATE
+    tx = np.exp(2j * np.pi * 1e5 * t).astype(np.complex64)
+    rx = gain * np.exp(1j * phase) * tx * np.exp(2j * np.pi * cfo_hz * t)
+    rng = np.random.default_rng(seed)
+    sigma = gain / np.sqrt(2 * 10 ** (snr_db / 10))
+    rx = rx + sigma * (rng.standard_normal(n) + 1j * rng.standard_normal(n))
+    return tx, rx.astype(np.complex64)
+
+
+@pytest.mark.parametrize("cfo_hz", [0.0, 2e3, 10e3, -50e3])
+def test_estimates_survive_carrier_offset(cfo_hz):
+    tx, rx = _pair(cfo_hz)
+    est = estimate_blocks(tx, rx, SAMP_RATE)
+    assert len(est) == 32
+    assert np.median(est["gain_db"]) == pytest.approx(20 * np.log10(0.3), abs=0.1)
+    assert np.median(est["snr_db"]) == pytest.approx(30.0, abs=1.5)
+    assert np.median(est["noise_db"]) == pytest.approx(20 * np.log10(0.3) - 30.0, abs=1.5)
+    assert np.median(est["cfo_hz"]) == pytest.approx(cfo_hz, abs=50)
+
+
+def test_silent_reference_gives_nan():
+    _, rx = _pair(0.0, blocks=2)
+    est = estimate_blocks(np.zeros_like(rx), rx, SAMP_RATE)
+    assert np.all(np.isnan(est["gain_db"])) and np.all(np.isnan(est["snr_db"]))
+    assert np.all(np.isfinite(est["noise_db"]))
+
+
+def test_odd_block_size_uses_direct_derotation():
+    tx, rx = _pair(5e3, blocks=8)
+    est = estimate_blocks(tx, rx, SAMP_RATE, block_size=1000)
+    assert np.median(est["gain_db"]) == pytest.approx(20 * np.log10(0.3), abs=0.1)
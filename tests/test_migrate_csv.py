@@ -0,0 +1,40 @@
+import numpy as np
+
+import main
+from capture_store import CaptureReader
+from migrate_csv import _chunk_ranges, _parse_chunk, migrate
+from tx_reference import write_params
+
+
+def _csv(tmp_path, cycles=2, num_samples=5000):
+    # signal.csv as save_to_csv appends it: one header, Index restarting per cycle.
+    csv_path = str(tmp_path / "signal.csv")
+    rxs = []
+    for cycle in range(cycles):
+        rx_path = str(tmp_path / f"rx{cycle}.dat")
+        params_path = str(tmp_path / f"txparams{cycle}.json")
+        rx = (np.arange(num_samples) * (0.25 - 0.5j) / num_samples + cycle).astype(np.complex64)
+        rx.tofile(rx_path)
+        write_params(params_path, 10e6, 1e5, 1)
+        main.save_to_csv(rx_path, params_path, csv_path)
+        rxs.append(rx)
+    return csv_path, rxs
+
+
+def test_parse_chunks_cover_every_row_once(tmp_path):
+    csv_path, rxs = _csv(tmp_path)
+    parts = [_parse_chunk(task) for task in _chunk_ranges(csv_path, 4099)]
+    index = np.concatenate([part[0] for part in parts])
+    rx = np.concatenate([part[2] for part in parts])
+    assert np.array_equal(index, np.tile(np.arange(5000), 2))
+    assert np.allclose(rx, np.concatenate(rxs), atol=1e-6)
+
+
+def test_migrate_splits_cycles(tmp_path):
+    csv_path, rxs = _csv(tmp_path)
+    cycles_dir = str(tmp_path / "cycles")
+    cycles = migrate(csv_path, cycles_dir, start_time=50.0, samp_rate=10e6, workers=2, chunk_bytes=1 << 16)
+    reader = CaptureReader(cycles_dir)
+    assert [info["start_time"] for info in reader.cycles()] == [50.0, 50.0 + 5000 / 10e6]
+    for cycle, rx in zip(cycles, rxs):
+        assert np.allclose(reader.read(cycle)[1], rx, atol=1e-6)
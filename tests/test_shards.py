@@ -0,0 +1,52 @@
+import json
+import os
+
+import numpy as np
+
+from capture_store import CaptureReader, prune_cycles, store_cycle
+from shards import MANIFEST_FILE, export_shards, prune_shards
+from tx_reference import write_params
+
+
+def _store(tmp_path, cycles_dir, start_time, num_samples=8192):
+    rx_path = str(tmp_path / "rxdata.dat")
+    params_path = str(tmp_path / "txparams.json")
+    (np.ones(num_samples, dtype=np.complex64) * 0.5).tofile(rx_path)
+    write_params(params_path, 10e6, 1e5, 1)
+    return store_cycle(params_path, rx_path, start_time, 10e6, cycles_dir)
+
+
+def _manifest(shards_dir):
+    with open(os.path.join(shards_dir, MANIFEST_FILE)) as file:
+        return json.load(file)["shards"]
+
+
+def test_reexport_replaces_rows_of_a_reused_cycle_number(tmp_path):
+    cycles_dir, shards_dir = str(tmp_path / "cycles"), str(tmp_path / "shards")
+    cycle = _store(tmp_path, cycles_dir, 100.0)
+    export_shards(cycle, cycles_dir, shards_dir, window=1024, shard_windows=4)
+    export_shards(cycle, cycles_dir, shards_dir, window=1024, shard_windows=4)
+    assert len(_manifest(shards_dir)) == 2
+
+    # A reset index hands out cycle 0 again for a different capture.
+    os.remove(os.path.join(cycles_dir, "index.csv"))
+    assert _store(tmp_path, cycles_dir, 200.0) == cycle
+    export_shards(cycle, cycles_dir, shards_dir, window=1024, shard_windows=4)
+    rows = _manifest(shards_dir)
+    assert len(rows) == 2 and all(row["start_time"] == 200.0 for row in rows)
+    assert sorted(os.listdir(shards_dir)) == sorted([MANIFEST_FILE] + [row["file"] for row in rows])
+
+
+def test_prune_removes_shards_with_their_cycles(tmp_path):
+    cycles_dir, shards_dir = str(tmp_path / "cycles"), str(tmp_path / "shards")
+    for start_time in (100.0, 200.0, 300.0):
+        export_shards(_store(tmp_path, cycles_dir, start_time), cycles_dir, shards_dir,
+                      window=1024, shard_windows=8)
+
+    pruned = prune_cycles(1, cycles_dir)
+    assert pruned == [0, 1]
+    assert len(prune_shards(pruned, shards_dir)) == 2
+    rows = _manifest(shards_dir)
+    assert [row["cycle"] for row in rows] == [c["cycle"] for c in CaptureReader(cycles_dir).cycles()] == [2]
+    assert sorted(os.listdir(shards_dir)) == sorted([MANIFEST_FILE, rows[0]["file"]])
+    assert prune_shards([5], shards_dir) == []
@@ -0,0 +1,16 @@
+import os
+
+from start_barrier import READY, StartBarrier, report_failure
+
+
+def test_failure_is_reported_without_waiting_for_the_timeout(capsys):
+    barrier = StartBarrier(("tx", "rx"))
+    # The child ends are used in-process here; report_failure closes its own.
+    os.write(barrier.child_fds("tx")[1], READY)
+    report_failure(barrier.child_args("rx")[1], "probe stream did not deliver 8192 samples in 0.5 s")
+
+    assert not barrier.wait_ready(timeout=60)
+    assert "rx failed before the start barrier: probe stream did not deliver" in capsys.readouterr().out
+    barrier.close()
+    for fd in barrier.child_fds("tx"):
+        os.close(fd)
@@ -0,0 +1,111 @@
+import csv
+
+import numpy as np
+
+import main
+from capture_store import CaptureReader
+from trigger import TriggerGate, find_active_windows, merge_windows, windows_path, write_windows
+from tx_reference import write_params
+
+
+def test_merge_windows_pads_and_merges():
+    active = np.array([False, True, False, False, True, True, False, False])
+    # Blocks 1 and 4-5 are active; 5 samples of context close the gap between them.
+    assert merge_windows(active, 10, 5, 5, 80) == [(5, 25), (35, 65)]
+    assert merge_windows(active, 10, 10, 10, 80) == [(0, 70)]
+
+
+def test_merge_windows_clips_to_capture():
+    active = np.array([True, False, True])
+    assert merge_windows(active, 10, 4, 4, 25) == [(0, 14), (16, 25)]
+    assert merge_windows(np.zeros(4, dtype=bool), 10, 4, 4, 40) == []
+
+
+def _capture(path, num_samples, active):
+    x = np.full(num_samples, 1e-4, dtype=np.complex64)
+    for start, stop in active:
+        x[start:stop] = 0.5 + 0.25j
+    x.tofile(path)
+    return x
+
+
+def test_find_active_windows(tmp_path):
+    rx_path = str(tmp_path / "rx.dat")
+    _capture(rx_path, 100000, [(20000, 30000), (70000, 80000)])
+    assert find_active_windows(rx_path, block_size=1000) == [(20000, 30000), (70000, 80000)]
+
+
+def test_save_to_csv_exports_only_windows(tmp_path):
+    rx_path = str(tmp_path / "rx.dat")
+    tx_path = str(tmp_path / "tx.dat")
+    csv_path = str(tmp_path / "signal.csv")
+    windows = [(20000, 30000), (70000, 80000)]
+    rx = _capture(rx_path, 100000, windows)
+    tx = (np.arange(100000) * (1 + 1j)).astype(np.complex64)
+    tx.tofile(tx_path)
+
+    main.save_to_csv(rx_path, tx_path, csv_path, windows)
+
+    with open(csv_path, newline='') as file:
+        rows = list(csv.reader(file))[1:]
+    assert len(rows) == 20000
+    expected = np.concatenate([np.arange(start, stop) for start, stop in windows])
+    assert np.array_equal(np.array([float(row[1]) for row in rows]), tx[expected].real)
+    assert np.allclose([float(row[4]) for row in rows], rx[expected].real)
+
+
+def test_save_to_csv_keeps_latest_window_samples(tmp_path):
+    rx_path = str(tmp_path / "rx.dat")
+    params_path = str(tmp_path / "txparams.json")
+    csv_path = str(tmp_path / "signal.csv")
+    _capture(rx_path, 100000, [])
+    write_params(params_path, 10e6, 1e5, 1)
+
+    assert main.export_ranges(100000, [(0, 40), (50, 100)], limit=60) == [(30, 40), (50, 100)]
+    main.save_to_csv(rx_path, params_path, csv_path, [(1000, 2000)])
+
+    with open(csv_path, newline='') as file:
+        assert len(list(csv.reader(file))) == 1 + 1000
+
+
+def _gate(x, chunk, **kwargs):
+    gate = TriggerGate(**kwargs)
+    spans = []
+    for start in range(0, len(x), chunk):
+        spans += gate.process(x[start:start + chunk])
+    return gate, spans + gate.flush()
+
+
+def test_gate_matches_offline_detector(tmp_path):
+    rx_path = str(tmp_path / "rx.dat")
+    x = _capture(rx_path, 100500, [(0, 1000), (20000, 30000), (33000, 34000), (70500, 80000), (100200, 100500)])
+    expected = find_active_windows(rx_path, block_size=1000, pre_samples=2500, post_samples=1500)
+    for chunk in (333, 1000, 8192):
+        gate, spans = _gate(x, chunk, block_size=1000, pre_samples=2500, post_samples=1500)
+        assert gate.windows == expected
+        assert gate.num_samples == len(x)
+        # Only the windows are passed on, each sample once and in order.
+        kept = np.concatenate([samples for _, samples in spans])
+        assert np.array_equal(kept, np.concatenate([x[start:stop] for start, stop in expected]))
+
+
+def test_gated_capture_is_archived_per_window(tmp_path):
+    rx_path = str(tmp_path / "rxdata.dat")
+    params_path = str(tmp_path / "txparams.json")
+    cycles_dir = str(tmp_path / "cycles")
+    x = _capture(str(tmp_path / "full.dat"), 100000, [(20000, 30000), (70000, 80000)])
+    write_params(params_path, 10e6, 1e5, 1)
+    gate, spans = _gate(x, 4096, block_size=1000)
+    np.concatenate([samples for _, samples in spans]).tofile(rx_path)
+    write_windows(windows_path(rx_path), gate.windows, gate.num_samples)
+
+    cycles = main.process_capture(rx_path, params_path, 1000.0, main.StageProfiler(False), 10e6,
+                                  cycles_dir=cycles_dir, shards_dir=str(tmp_path / "shards"),
+                                  csv_file_path=str(tmp_path / "signal.csv"))
+
+    reader = CaptureReader(cycles_dir)
+    assert [(info["start_time"], info["num_samples"]) for info in reader.cycles()] == [
+        (1000.002, 10000), (1000.007, 10000)]
+    for cycle, (start, stop) in zip(cycles, gate.windows):
+        assert np.array_equal(reader.read(cycle)[1], x[start:stop])
+    assert not any(tmp_path.glob("rxdata*"))
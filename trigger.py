@@ -0,0 +1,175 @@
+import collections
+import json
+import os
+
+import numpy as np
+
+from capture_store import SAMPLE_SIZE
+
+TRIGGER_BLOCK = 10000           # samples per detector block (1 ms at 10 MS/s)
+TRIGGER_THRESHOLD_DB = -30.0    # mean block power, in dB relative to full scale
+CHUNK_BLOCKS = 100              # blocks read from disk per detector step
+WINDOWS_EXT = ".windows.json"
+
+
+def block_power_db(x, block_size=TRIGGER_BLOCK):
+    # Mean power per block in dBFS; a trailing partial block is averaged on its own.
+    power = x.real * x.real + x.imag * x.imag
+    full = len(power) // block_size * block_size
+    means = power[:full].reshape(-1, block_size).mean(axis=1)
+    if full < len(power):
+        means = np.append(means, power[full:].mean())
+    return 10 * np.log10(np.maximum(means, 1e-20))
+
+
+def merge_windows(active, block_size, pre_samples, post_samples, num_samples):
+    # Converts per-block activity flags into merged [start, stop) sample spans
+    # padded with pre/post-trigger context.
+    flags = np.concatenate(([False], active, [False])).astype(np.int8)
+    edges = np.diff(flags)
+    starts = np.flatnonzero(edges == 1) * block_size - pre_samples
+    stops = np.flatnonzero(edges == -1) * block_size + post_samples
+    starts = np.clip(starts, 0, num_samples)
+    stops = np.clip(stops, 0, num_samples)
+
+    windows = []
+    for start, stop in zip(starts, stops):
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], stop)
+        else:
+            windows.append([start, stop])
+    return [(int(start), int(stop)) for start, stop in windows]
+
+
+def find_active_windows(rx_file_path, threshold_db=TRIGGER_THRESHOLD_DB, block_size=TRIGGER_BLOCK,
+                        pre_samples=0, post_samples=0):
+    active = []
+    num_samples = 0
+    with open(rx_file_path, "rb") as file:
+        while True:
+            rx = np.fromfile(file, dtype=np.complex64, count=block_size * CHUNK_BLOCKS)
+            if not len(rx):
+                break
+            active.append(block_power_db(rx, block_size) > threshold_db)
+            num_samples += len(rx)
+    if not active:
+        return []
+    return merge_windows(np.concatenate(active), block_size, pre_samples, post_samples, num_samples)
+
+
+class TriggerGate:
+    """Streaming form of find_active_windows: passes on only the active blocks and their context.
+
+    process() takes samples as they arrive and returns the (offset, samples) spans
+    to keep; up to pre_samples of inactive input are held back in case the next
+    block triggers. The windows it produces match find_active_windows on the
+    same capture.
+    """
+
+    def __init__(self, threshold_db=TRIGGER_THRESHOLD_DB, block_size=TRIGGER_BLOCK, pre_samples=0,
+                 post_samples=0):
+        self.threshold_db = threshold_db
+        self.block_size = block_size
+        self.pre_samples = pre_samples
+        self.post_samples = post_samples
+        self.num_samples = 0
+        self._windows = []
+        self._pending = []
+        self._pending_len = 0
+        self._history = collections.deque()
+        self._history_len = 0
+        self._hold = 0
+
+    @property
+    def windows(self):
+        return [(start, stop) for start, stop in self._windows]
+
+    def process(self, x):
+        if self._pending_len + len(x) < self.block_size:
+            # x may be a view of the flowgraph's buffer, which is reused after work().
+            self._pending.append(np.array(x))
+            self._pending_len += len(x)
+            return []
+        data = np.concatenate(self._pending + [x])
+        full = len(data) // self.block_size * self.block_size
+        self._pending = [data[full:]] if full < len(data) else []
+        self._pending_len = len(data) - full
+        return self._classify(data[:full])
+
+    def flush(self):
+        # The trailing partial block is judged on its own, as block_power_db does.
+        if not self._pending:
+            return []
+        data = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_len = 0
+        return self._classify(data)
+
+    def _classify(self, data):
+        spans = []
+        active = block_power_db(data, self.block_size) > self.threshold_db
+        for i, is_active in enumerate(active):
+            block = data[i * self.block_size:(i + 1) * self.block_size]
+            if is_active:
+                if self._history_len:
+                    history = np.concatenate(self._history)[-self.pre_samples:]
+                    self._emit(spans, self.num_samples - len(history), history)
+                    self._history.clear()
+                    self._history_len = 0
+                self._emit(spans, self.num_samples, block)
+                self._hold = self.post_samples
+            else:
+                take = min(self._hold, len(block))
+                if take:
+                    self._emit(spans, self.num_samples, block[:take])
+                    self._hold -= take
+                if self.pre_samples and take < len(block):
+                    self._history.append(block[take:])
+                    self._history_len += len(block) - take
+                    while self._history_len - len(self._history[0]) >= self.pre_samples:
+                        self._history_len -= len(self._history.popleft())
+            self.num_samples += len(block)
+        return spans
+
+    def _emit(self, spans, offset, samples):
+        spans.append((offset, samples))
+        if self._windows and self._windows[-1][1] == offset:
+            self._windows[-1][1] += len(samples)
+        else:
+            self._windows.append([offset, offset + len(samples)])
+
+
+def windows_path(data_path):
+    # Sidecar RX.py writes next to a gated capture.
+    return os.path.splitext(data_path)[0] + WINDOWS_EXT
+
+
+def write_windows(path, windows, num_samples):
+    with open(path, "w") as file:
+        json.dump({"num_samples": num_samples, "windows": windows}, file)
+
+
+def read_windows(path):
+    with open(path) as file:
+        data = json.load(file)
+    return [tuple(window) for window in data["windows"]], data["num_samples"]
+
+
+def gated_offset(windows, sample):
+    # Position of capture sample in a gated file, which holds the windows back to back.
+    offset = 0
+    for start, stop in windows:
+        if start <= sample <= stop:
+            return offset + sample - start
+        offset += stop - start
+    raise ValueError(f"Sample {sample} is outside the gated windows")
+
+
+def duty_cycle(windows, num_samples):
+    if not num_samples:
+        return 0.0
+    return sum(stop - start for start, stop in windows) / num_samples
+
+
+def capture_length(file_path):
+    return os.path.getsize(file_path) // SAMPLE_SIZE
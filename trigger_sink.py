@@ -0,0 +1,46 @@
+import numpy as np
+from gnuradio import gr
+
+from trigger import TRIGGER_BLOCK, TRIGGER_THRESHOLD_DB, TriggerGate, windows_path, write_windows
+
+WRITE_BUFFER = 1 << 20    # bytes buffered per write()
+
+
+class trigger_file_sink(gr.sync_block):
+    """File sink that writes only the active windows of its input, back to back.
+
+    The windows, in capture sample offsets, go to a .windows.json sidecar on
+    stop so the capture store can map the file back onto the capture.
+    """
+
+    def __init__(self, filename, threshold_db=TRIGGER_THRESHOLD_DB, block_size=TRIGGER_BLOCK, pre_samples=0,
+                 post_samples=0, dtype=np.complex64):
+        gr.sync_block.__init__(self, name="Trigger File Sink", in_sig=[dtype], out_sig=None)
+        self.filename = filename
+        self.threshold_db = threshold_db
+        self.block_size = block_size
+        self.pre_samples = pre_samples
+        self.post_samples = post_samples
+        self._file = None
+
+    def start(self):
+        self._gate = TriggerGate(self.threshold_db, self.block_size, self.pre_samples, self.post_samples)
+        self._file = open(self.filename, "wb", buffering=WRITE_BUFFER)
+        return True
+
+    def stop(self):
+        if self._file is None:
+            return True
+        self._write(self._gate.flush())
+        self._file.close()
+        self._file = None
+        write_windows(windows_path(self.filename), self._gate.windows, self._gate.num_samples)
+        return True
+
+    def _write(self, spans):
+        for _, samples in spans:
+            samples.tofile(self._file)
+
+    def work(self, input_items, output_items):
+        self._write(self._gate.process(input_items[0]))
+        return len(input_items[0])
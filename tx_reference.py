@@ -0,0 +1,138 @@
+import functools
+import json
+from fractions import Fraction
+
+import numpy as np
+
+from channels import in_passband
+from waveforms import load_waveform
+
+TX_PARAMS_FILE = "txparams.json"
+CACHE_SIZE = 8  # synthesized ranges kept in memory
+MAX_PERIOD = 1 << 16  # longest tone period built as a table and tiled
+TONE_BLOCK = 4096  # samples per exact phasor for tones that don't repeat
+
+_load_waveform = functools.lru_cache(maxsize=4)(load_waveform)
+
+
+def write_params(path, samp_rate, frequency, amplitude, offset=0.0, phase=0.0, start_index=0,
+                 waveform="sine"):
+    # For library waveforms frequency is a mixing offset applied on top of the
+    # cached samples, and waveform_rate is the rate they were generated at.
+    with open(path, "w") as file:
+        json.dump({
+            "waveform": waveform,
+            "waveform_rate": samp_rate,
+            "samp_rate": samp_rate,
+            "frequency": frequency,
+            "amplitude": amplitude,
+            "offset": offset,
+            "phase": phase,
+            "start_index": start_index,
+        }, file)
+
+
+def load_params(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def is_params_file(path):
+    return path.endswith(".json")
+
+
+def _phase(n, samp_rate, frequency, phase):
+    # Wrap the cycle count before scaling so the phase stays exact far into a capture.
+    cycles = np.mod(frequency * np.asarray(n, dtype=np.float64) / samp_rate, 1.0)
+    return phase + 2 * np.pi * cycles
+
+
+def _tone_period(samp_rate, frequency):
+    # Samples per exact repeat of the tone, or None if it doesn't repeat within MAX_PERIOD.
+    ratio = frequency / samp_rate
+    fraction = Fraction(ratio).limit_denominator(MAX_PERIOD)
+    return fraction.denominator if float(fraction) == ratio else None
+
+
+def _repeat(table, start, count):
+    # table looped from sample start onward; a tile, so no per-sample index math.
+    rolled = np.roll(table, -(start % len(table)))
+    return np.tile(rolled, -(-count // len(table)))[:count]
+
+
+def _tone(start, stop, samp_rate, frequency, phase):
+    # exp(j*(phase + 2*pi*f*n/fs)) for n in [start, stop) as complex64.
+    count = stop - start
+    period = _tone_period(samp_rate, frequency)
+    if period is not None:
+        table = np.exp(1j * _phase(np.arange(period), samp_rate, frequency, phase)).astype(np.complex64)
+        return _repeat(table, start, count)
+    # Otherwise one exact phasor per block times a shared block of rotations,
+    # so the complex64 error stays bounded by the block length.
+    blocks = -(-count // TONE_BLOCK)
+    rotation = np.exp(1j * _phase(np.arange(TONE_BLOCK), samp_rate, frequency, 0.0)).astype(np.complex64)
+    phasors = np.exp(1j * _phase(start + np.arange(blocks) * TONE_BLOCK, samp_rate, frequency, phase))
+    return (phasors.astype(np.complex64)[:, None] * rotation).reshape(-1)[:count]
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _synthesize(waveform, waveform_rate, samp_rate, frequency, amplitude, offset, phase, start, stop):
+    if waveform == "sine":
+        # GNU Radio's complex GR_SIN_WAVE is exp(j*phi) rotated by -90 degrees.
+        out = _tone(start, stop, samp_rate, frequency, phase - np.pi / 2)
+    else:
+        # The cached waveform loops at the rate it was generated for, mixed by frequency.
+        if samp_rate != waveform_rate:
+            raise ValueError(f"{waveform} was generated at {waveform_rate:g} S/s and can't be "
+                             f"regenerated at {samp_rate:g} S/s; record TX instead")
+        out = _repeat(_load_waveform(waveform, waveform_rate), start, stop - start)
+        if frequency or phase:
+            out *= _tone(start, stop, samp_rate, frequency, phase)
+    if amplitude != 1:
+        out *= np.complex64(amplitude)
+    if offset:
+        out += np.complex64(offset)
+    out.flags.writeable = False
+    return out
+
+
+def is_constant_envelope(params):
+    # A regenerated plain tone has |tx| == amplitude everywhere.
+    return params["waveform"] == "sine" and not params["offset"]
+
+
+def synthesize(params, start, stop):
+    # Reference samples [start, stop) relative to the first recorded sample.
+    first = params["start_index"]
+    return _synthesize(params["waveform"], float(params.get("waveform_rate", params["samp_rate"])),
+                       float(params["samp_rate"]), float(params["frequency"]),
+                       float(params["amplitude"]), float(params["offset"]), float(params["phase"]),
+                       first + start, first + stop)
+
+
+def derive_params(src_path, dst_path, decimation=1, freq_offset=0.0, cutoff=None):
+    # The reference after decimating by D (and, for a channelizer output, mixing
+    # the channel centre to DC) is the same tone shifted and sampled at fs / D.
+    # A tone (or DC offset) outside the RX filter's cutoff was filtered out of
+    # the capture, so it is dropped from the reference too rather than aliased in.
+    params = load_params(src_path)
+    if params["waveform"] != "sine" and (decimation != 1 or freq_offset):
+        # Taking every D-th sample of a wideband waveform aliases the whole band,
+        # while RX kept only what passed its FIR or PFB.
+        raise ValueError(f"A {params['waveform']} reference can't be derived for a decimated or "
+                         f"channelized capture; record TX at full rate instead")
+    params["samp_rate"] = params["samp_rate"] / decimation
+    params["frequency"] = params["frequency"] - freq_offset
+    if cutoff is not None:
+        if not in_passband(params["frequency"], cutoff):
+            params["amplitude"] = 0.0
+        if not in_passband(freq_offset, cutoff):
+            params["offset"] = 0.0
+    with open(dst_path, "w") as file:
+        json.dump(params, file)
+
+
+def shift_params(params, start):
+    shifted = dict(params)
+    shifted["start_index"] = params["start_index"] + start
+    return shifted
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+WAVEFORM_DIR = os.path.join("Data", "waveforms")
+
+
+def chirp(samp_rate, f0=-4e6, f1=4e6, duration=1e-3):
+    # Linear sweep from f0 to f1 over duration, repeated.
+    t = np.arange(int(round(duration * samp_rate))) / samp_rate
+    rate = (f1 - f0) / duration
+    return np.exp(2j * np.pi * (f0 * t + 0.5 * rate * t * t))
+
+
+def pn(samp_rate, num_chips=32767, samples_per_chip=4, seed=1):
+    # BPSK pseudo-noise sequence with rectangular chips.
+    chips = np.random.default_rng(seed).integers(0, 2, num_chips) * 2 - 1
+    return np.repeat(chips, samples_per_chip).astype(np.complex128)
+
+
+def multitone(samp_rate, num_tones=16, bandwidth=8e6, length=10000):
+    # Tones on FFT bins so the waveform loops seamlessly; Schroeder phases keep
+    # the crest factor low.
+    bins = np.round(np.linspace(-bandwidth / 2, bandwidth / 2, num_tones) / samp_rate * length).astype(int)
+    k = np.arange(num_tones)
+    spectrum = np.zeros(length, dtype=np.complex128)
+    spectrum[bins % length] = np.exp(-1j * np.pi * k * (k - 1) / num_tones)
+    return np.fft.ifft(spectrum)
+
+
+def ofdm(samp_rate, fft_size=64, cp_len=16, num_symbols=100, used_carriers=52, seed=0):
+    # OFDM-like frame: random QPSK on the used carriers around DC, cyclic prefix,
+    # no pilots or preamble.
+    rng = np.random.default_rng(seed)
+    qpsk = (rng.integers(0, 2, (num_symbols, used_carriers)) * 2 - 1
+            + 1j * (rng.integers(0, 2, (num_symbols, used_carriers)) * 2 - 1)) / np.sqrt(2)
+    carriers = np.r_[np.arange(1, used_carriers // 2 + 1), np.arange(-(used_carriers // 2), 0)] % fft_size
+    grid = np.zeros((num_symbols, fft_size), dtype=np.complex128)
+    grid[:, carriers] = qpsk
+    symbols = np.fft.ifft(grid, axis=1)
+    return np.concatenate((symbols[:, -cp_len:], symbols), axis=1).reshape(-1)
+
+
+WAVEFORMS = {
+    "chirp": chirp,
+    "pn": pn,
+    "multitone": multitone,
+    "ofdm": ofdm,
+}
+
+
+def waveform_path(name, samp_rate, params=None, waveform_dir=WAVEFORM_DIR):
+    # The rate is normalised so 10000000 and 10000000.0 share one cache file.
+    key = json.dumps({"name": name, "samp_rate": float(samp_rate), "params": params or {}}, sort_keys=True)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return os.path.join(waveform_dir, f"{name}-{digest}.dat")
+
+
+def load_waveform(name, samp_rate, params=None, waveform_dir=WAVEFORM_DIR):
+    # Generated once, normalised to unit peak and cached on disk as complex64.
+    if name not in WAVEFORMS:
+        raise ValueError(f"Unknown waveform {name!r}; choose from {', '.join(WAVEFORMS)}")
+    path = waveform_path(name, samp_rate, params, waveform_dir)
+    if os.path.exists(path):
+        return np.fromfile(path, dtype=np.complex64)
+
+    wave = WAVEFORMS[name](samp_rate, **(params or {}))
+    wave = (wave / np.max(np.abs(wave))).astype(np.complex64)
+    os.makedirs(waveform_dir, exist_ok=True)
+    tmp_path = path + ".tmp"
+    wave.tofile(tmp_path)
+    os.replace(tmp_path, path)
+    return wave